@@ -4,19 +4,74 @@
 import frappe
 import json
 import base64
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from frappe import _
-from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
+from frappe.utils.password import decrypt, encrypt
+from pwp_project.pwp_project.doctype.user_crypto_keys.user_crypto_keys import UserCryptoKeys
+from pwp_project.pwp_project.utils import is_system_manager, has_permission_cached
+
+# Pre-generated RSA key pairs kept in Redis, so key generation stays off the request path
+RSA_KEY_POOL_SIZE = 8
+RSA_POOLED_KEY_SIZES = (2048,)
+RSA_KEY_POOL_CACHE_KEY = "rsa_key_pool:{0}"
+
+# Largest number of users one bulk key generation job accepts
+BULK_KEY_GENERATION_LIMIT = 500
+
+def refill_rsa_key_pool():
+    """
+    Top up the pool of pre-generated RSA key pairs (scheduled job)
+    """
+    from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
+
+    cache = frappe.cache()
+    for key_size in RSA_POOLED_KEY_SIZES:
+        cache_key = RSA_KEY_POOL_CACHE_KEY.format(key_size)
+        for i in range(RSA_KEY_POOL_SIZE - cache.llen(cache_key)):
+            push_pooled_rsa_key_pair(key_size, DigitalSignature.generate_rsa_key_pair(key_size))
+
+def push_pooled_rsa_key_pair(key_size, key_pair):
+    """
+    Add an RSA key pair to the pool, encrypted with the site key so no private key sits in Redis in clear
+    """
+    frappe.cache().rpush(RSA_KEY_POOL_CACHE_KEY.format(key_size), encrypt(json.dumps(key_pair)))
+
+def pop_pooled_rsa_key_pair(key_size):
+    """
+    Claim a pre-generated RSA key pair, or return None if the pool is empty
+    """
+    key_pair = frappe.cache().lpop(RSA_KEY_POOL_CACHE_KEY.format(key_size))
+    if not key_pair:
+        return None
+
+    try:
+        return json.loads(decrypt(key_pair))
+    except frappe.ValidationError:
+        # Not encrypted with this site's key (e.g. pooled before encryption); treat as a miss
+        return None
 
 @frappe.whitelist()
-def generate_key_pair(algorithm='RSA', key_size=2048, curve='secp256r1', password=None):
+def generate_key_pair(algorithm='ECDSA', key_size=2048, curve='secp256r1', password=None):
     """
     Generate a new key pair for digital signatures
+
+    Defaults to ECDSA on P-256 (secp256r1), which matches the security of
+    RSA-3072 while generating and signing far faster. Pass algorithm='RSA'
+    where RSA keys are required; key sizes below 2048 bits are deprecated.
     """
     try:
-        from pwp_project.pwp_project.doctype.user_crypto_keys.user_crypto_keys import UserCryptoKeys
+        from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
 
         if algorithm.upper() == 'RSA':
-            private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair(key_size)
+            key_size = int(key_size)
+            # Claim a pre-generated pair, generating inline only when the pool is empty
+            key_pair = pop_pooled_rsa_key_pair(key_size)
+            if not key_pair:
+                key_pair = DigitalSignature.generate_rsa_key_pair(key_size)
+            private_key_pem, public_key_pem = key_pair
         elif algorithm.upper() == 'ECDSA':
             private_key_pem, public_key_pem = DigitalSignature.generate_ecdsa_key_pair(curve)
         else:
@@ -36,19 +91,92 @@ def generate_key_pair(algorithm='RSA', key_size=2048, curve='secp256r1', passwor
         frappe.log_error(f"Key pair generation failed: {str(e)}", "Digital Signature API")
         frappe.throw(_("Failed to generate key pair: {0}").format(str(e)))
 
+def _generate_key_pair_in_subprocess(algorithm, key_size, curve):
+    """
+    Generate one key pair; runs in a ProcessPoolExecutor worker
+    """
+    from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
+
+    if algorithm == 'ECDSA':
+        return DigitalSignature.generate_ecdsa_key_pair(curve)
+    return DigitalSignature.generate_rsa_key_pair(key_size)
+
+@frappe.whitelist()
+def generate_key_pairs_bulk(user_ids, algorithm='RSA', key_size=2048, curve='secp256r1'):
+    """
+    Queue key pair generation for several users on the long queue
+    Returns: dict with the background job id
+    """
+    frappe.only_for("System Manager")
+
+    user_ids = frappe.parse_json(user_ids)
+    algorithm = algorithm.upper()
+    key_size = int(key_size)
+
+    if algorithm not in ('RSA', 'ECDSA'):
+        frappe.throw(_("Unsupported algorithm: {0}").format(algorithm))
+
+    if not user_ids:
+        return {"status": "success", "users": []}
+
+    if len(user_ids) > BULK_KEY_GENERATION_LIMIT:
+        frappe.throw(_("Cannot generate key pairs for more than {0} users at once").format(BULK_KEY_GENERATION_LIMIT))
+
+    job = frappe.enqueue(
+        "pwp_project.api.digital_signature.generate_key_pairs_bulk_job",
+        queue="long",
+        user_ids=user_ids,
+        algorithm=algorithm,
+        key_size=key_size,
+        curve=curve,
+        now=frappe.flags.in_test
+    )
+
+    return {
+        "status": "queued",
+        "message": _("Key pair generation queued"),
+        "users": user_ids,
+        # Jobs run inline (in tests) have no id
+        "job_id": getattr(job, "id", None)
+    }
+
+def generate_key_pairs_bulk_job(user_ids, algorithm, key_size, curve):
+    """
+    Generate and store key pairs for several users, spreading generation across CPU cores (background job)
+    """
+    try:
+        # Spawned workers do not inherit this process's database connection
+        max_workers = min(len(user_ids), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            key_pairs = list(executor.map(
+                _generate_key_pair_in_subprocess,
+                repeat(algorithm, len(user_ids)),
+                repeat(key_size, len(user_ids)),
+                repeat(curve, len(user_ids))
+            ))
+
+        for user_id, (private_key_pem, public_key_pem) in zip(user_ids, key_pairs):
+            UserCryptoKeys.store_user_keys(user_id, private_key_pem, public_key_pem)
+
+    except Exception as e:
+        frappe.log_error(f"Bulk key pair generation failed: {str(e)}", "Digital Signature API")
+        raise
+
 @frappe.whitelist()
-def sign_document(document_name, document_version=None, algorithm='RSA', password=None):
+def sign_document(document_name, document_version=None, algorithm=None, password=None):
     """
     Sign a document with the user's private key
+
+    The algorithm defaults to the type of the user's key, so ECDSA keys
+    (the default for new key pairs) and existing RSA keys both work.
     """
     try:
         # Check if user has permission to read this document
-        if not frappe.has_permission("Document", "read", document_name):
+        if not has_permission_cached("Document", "read", document_name):
             frappe.throw(_("Not permitted to read document: {0}").format(document_name))
 
         # Get user's private key
         user_id = frappe.session.user
-        from pwp_project.pwp_project.doctype.user_crypto_keys.user_crypto_keys import UserCryptoKeys
         private_key_pem = UserCryptoKeys.get_user_private_key(user_id, password)
 
         # Create digital signature record
@@ -84,14 +212,17 @@ def verify_signature(signature_name):
     Verify a digital signature
     """
     try:
-        # Get the signature document
-        signature_doc = frappe.get_doc("Digital Signature", signature_name)
+        # Read only the linked document for the permission check
+        document_name = frappe.db.get_value("Digital Signature", signature_name, "document")
+        if not document_name:
+            frappe.throw(_("Digital Signature {0} not found").format(signature_name), frappe.DoesNotExistError)
 
         # Check if user has permission to read this document
-        if not frappe.has_permission("Document", "read", signature_doc.document):
-            frappe.throw(_("Not permitted to read document: {0}").format(signature_doc.document))
+        if not has_permission_cached("Document", "read", document_name):
+            frappe.throw(_("Not permitted to read document: {0}").format(document_name))
 
         # Verify the signature
+        signature_doc = frappe.get_doc("Digital Signature", signature_name)
         signature_doc.verify_signature()
 
         return {
@@ -114,10 +245,9 @@ def get_user_public_key(user_id=None):
             user_id = frappe.session.user
 
         # Check if user has permission to read user profiles
-        if user_id != frappe.session.user and not frappe.has_role("System Manager"):
+        if user_id != frappe.session.user and not is_system_manager():
             frappe.throw(_("Not permitted to access other users' public keys"))
 
-        from pwp_project.pwp_project.doctype.user_crypto_keys.user_crypto_keys import UserCryptoKeys
         public_key_pem = UserCryptoKeys.get_user_public_key(user_id)
 
         return {
@@ -136,7 +266,7 @@ def get_document_signatures(document_name):
     """
     try:
         # Check if user has permission to read this document
-        if not frappe.has_permission("Document", "read", document_name):
+        if not has_permission_cached("Document", "read", document_name):
             frappe.throw(_("Not permitted to read document: {0}").format(document_name))
 
         # Get all signatures for the document
@@ -161,19 +291,21 @@ def revoke_signature(signature_name, reason=""):
     Revoke a digital signature
     """
     try:
-        # Get the signature document
-        signature_doc = frappe.get_doc("Digital Signature", signature_name)
+        # Read only the fields needed for the permission checks
+        signature = frappe.db.get_value("Digital Signature", signature_name, ["document", "signed_by"], as_dict=True)
+        if not signature:
+            frappe.throw(_("Digital Signature {0} not found").format(signature_name), frappe.DoesNotExistError)
 
         # Check if user has permission to write this document
-        if not frappe.has_permission("Document", "write", signature_doc.document):
-            frappe.throw(_("Not permitted to update document: {0}").format(signature_doc.document))
+        if not has_permission_cached("Document", "write", signature.document):
+            frappe.throw(_("Not permitted to update document: {0}").format(signature.document))
 
         # Only the signer or a system manager can revoke a signature
-        if signature_doc.signed_by != frappe.session.user and not frappe.has_role("System Manager"):
+        if signature.signed_by != frappe.session.user and not is_system_manager():
             frappe.throw(_("Not permitted to revoke this signature"))
 
         # Revoke the signature
-        signature_doc.revoke_signature(reason)
+        frappe.get_doc("Digital Signature", signature_name).revoke_signature(reason)
 
         return {
             "status": "success",
@@ -191,7 +323,7 @@ def verify_external_signature(document_name, signature_data, certificate_info):
     """
     try:
         # Check if user has permission to read this document
-        if not frappe.has_permission("Document", "read", document_name):
+        if not has_permission_cached("Document", "read", document_name):
             frappe.throw(_("Not permitted to read document: {0}").format(document_name))
 
         # Create digital signature record for external signature
@@ -3,28 +3,53 @@
 
 import frappe
 import json
+import re
 from frappe import _
-from frappe.utils import now, getdate, add_days
+from frappe.utils import now, getdate, add_days, cint
 from frappe.model.document import Document
-from pwp_project.pwp_project.doctype.document.document import Document
+from pwp_project.pwp_project.doctype.document.document import Document, VALID_STATUS_TRANSITIONS, VERSION_LIST_FIELDS
 from pwp_project.pwp_project.doctype.document_version.document_version import DocumentVersion
+from pwp_project.pwp_project.doctype.audit_log.audit_log import log_action
+from pwp_project.pwp_project.doctype.notification_log.notification_log import NotificationLog
+from pwp_project.pwp_project.utils import FULLTEXT_MIN_WORD_LENGTH, like_pattern, is_system_manager, has_permission_cached, make_etag, set_etag, not_modified
+
+# Orders list_documents accepts, each backed by an index so pages need no filesort
+DOCUMENT_LIST_ORDERS = {
+    "modified desc": "modified desc, name desc",
+    "modified asc": "modified asc, name asc",
+    "document_date desc": "document_date desc, name desc",
+    "title asc": "title asc, name asc"
+}
 
 @frappe.whitelist()
 def get_document(document_name):
     """
     Get a document by name with permissions check
     """
-    # Check if user has permission to read this document
-    if not frappe.has_permission("Document", "read", document_name):
-        frappe.throw(_("Not permitted to read document: {0}").format(document_name))
-
-    # Get the document
+    # The document, its versions and its audit trail all change its ETag
+    version = frappe.db.sql("""
+        SELECT doc.modified,
+            (SELECT MAX(modified) FROM `tabDocument Version` WHERE document = doc.name),
+            (SELECT MAX(modified) FROM `tabAudit Log` WHERE document = doc.name)
+        FROM `tabDocument` doc
+        WHERE doc.name = %s
+    """, document_name)
+
+    if version and set_etag(make_etag(frappe.session.user, *version[0])):
+        if not has_permission_cached("Document", "read", document_name):
+            frappe.throw(_("Not permitted to read document: {0}").format(document_name))
+        return not_modified()
+
+    # Load the document once and check permission against the loaded doc,
+    # instead of letting has_permission fetch it a second time
     doc = frappe.get_doc("Document", document_name)
+    if not doc.has_permission("read"):
+        frappe.throw(_("Not permitted to read document: {0}").format(document_name))
 
     # Get document versions
     versions = frappe.get_all("Document Version",
         filters={"document": document_name},
-        fields=["name", "version_number", "version_notes", "created_by", "created_on", "is_current"],
+        fields=VERSION_LIST_FIELDS + ["is_current"],
         order_by="version_number desc"
     )
 
@@ -51,7 +76,7 @@ def create_document(**kwargs):
     Create a new document with validation and initial version creation
     """
     # Check if user has permission to create documents
-    if not frappe.has_permission("Document", "create"):
+    if not has_permission_cached("Document", "create"):
         frappe.throw(_("Not permitted to create documents"))
 
     # Extract document data from kwargs
@@ -78,14 +103,21 @@ def create_document(**kwargs):
     doc.create_version(version_notes)
 
     # Log the creation
-    frappe.get_doc("Audit Log").log_action(
+    log_action(
         document_name=doc.name,
         action="Created",
         details=f"Document '{doc.title}' created with initial version"
     )
 
-    # Send notification to relevant users
-    send_document_notification(doc.name, "created")
+    # Send notification to relevant users once the document is committed
+    frappe.enqueue(
+        "pwp_project.api.document.send_document_notification",
+        queue="short",
+        document_name=doc.name,
+        event="created",
+        enqueue_after_commit=True,
+        now=frappe.flags.in_test
+    )
 
     return {
         "status": "success",
@@ -99,7 +131,7 @@ def update_document(document_name, **kwargs):
     Update a document with version tracking and change logging
     """
     # Check if user has permission to write this document
-    if not frappe.has_permission("Document", "write", document_name):
+    if not has_permission_cached("Document", "write", document_name):
         frappe.throw(_("Not permitted to update document: {0}").format(document_name))
 
     # Get the document
@@ -136,12 +168,12 @@ def update_document(document_name, **kwargs):
     doc.save()
 
     # Check if significant changes were made to create a new version
-    if should_create_version(old_values, doc.as_dict()):
+    if should_create_version(old_values, doc):
         version_notes = kwargs.get("version_notes", "Updated document")
         doc.create_version(version_notes)
 
     # Log the update
-    frappe.get_doc("Audit Log").log_action(
+    log_action(
         document_name=doc.name,
         action="Updated",
         details=f"Document '{doc.title}' updated"
@@ -149,7 +181,14 @@ def update_document(document_name, **kwargs):
 
     # Send notifications based on status changes
     if old_values["status"] != doc.status:
-        send_document_notification(doc.name, f"status_changed_to_{doc.status.lower()}")
+        frappe.enqueue(
+            "pwp_project.api.document.send_document_notification",
+            queue="short",
+            document_name=doc.name,
+            event=f"status_changed_to_{doc.status.lower()}",
+            enqueue_after_commit=True,
+            now=frappe.flags.in_test
+        )
 
     return {
         "status": "success",
@@ -163,7 +202,7 @@ def delete_document(document_name):
     Delete a document with proper checks and archival
     """
     # Check if user has permission to delete this document
-    if not frappe.has_permission("Document", "delete", document_name):
+    if not has_permission_cached("Document", "delete", document_name):
         frappe.throw(_("Not permitted to delete document: {0}").format(document_name))
 
     # Get the document
@@ -174,7 +213,7 @@ def delete_document(document_name):
         frappe.throw(_("Cannot delete {0} documents").format(doc.status))
 
     # Log the deletion before actually deleting
-    frappe.get_doc("Audit Log").log_action(
+    log_action(
         document_name=doc.name,
         action="Deleted",
         details=f"Document '{doc.title}' deleted by {frappe.session.user}"
@@ -194,35 +233,52 @@ def list_documents(filters=None, fields=None, order_by="modified", order="desc",
     List documents with filtering and pagination
     """
     # Check if user has permission to read documents
-    if not frappe.has_permission("Document", "read"):
+    if not has_permission_cached("Document", "read"):
         frappe.throw(_("Not permitted to read documents"))
 
+    # Only sort by known, indexed columns
+    order_sql = DOCUMENT_LIST_ORDERS.get(f"{order_by} {order}".strip().lower())
+    if not order_sql:
+        frappe.throw(_("Cannot sort documents by {0} {1}").format(order_by, order))
+
     # Prepare filters
-    if not filters:
-        filters = {}
+    filters = frappe.parse_json(filters) if filters else {}
 
     # Apply security level filtering based on user role
-    if not frappe.has_role("System Manager"):
+    if not is_system_manager():
         filters["security_level"] = ["in", ["Public", "Internal"]]
 
     # Prepare fields
-    if not fields:
+    if fields:
+        fields = frappe.parse_json(fields)
+    else:
         fields = ["name", "title", "document_type", "status", "security_level", "owner", "creation_date", "last_modified"]
 
     # Calculate offset for pagination
+    limit = cint(limit) or 20
+    page = cint(page) or 1
     offset = (page - 1) * limit
 
+    # The newest modification and the match count change whenever the
+    # listing does, so together with the request they form its ETag
+    stats = frappe.get_all("Document",
+        filters=filters,
+        fields=["max(modified) as last_modified", "count(*) as total_count"]
+    )[0]
+    total_count = stats.total_count
+
+    if set_etag(make_etag(frappe.session.user, filters, fields, order_by, order, limit, page,
+            stats.last_modified, total_count)):
+        return not_modified()
+
     # Get documents
     documents = frappe.get_all("Document",
         filters=filters,
         fields=fields,
-        order_by=f"{order_by} {order}",
+        order_by=order_sql,
         limit=limit,
         start=offset
-    )
-
-    # Get total count for pagination
-    total_count = frappe.db.count("Document", filters=filters)
+    ) if total_count > offset else []
 
     return {
         "documents": documents,
@@ -238,35 +294,61 @@ def search_documents(query, filters=None, fields=None, limit=20):
     Search documents by text query with optional filters
     """
     # Check if user has permission to read documents
-    if not frappe.has_permission("Document", "read"):
+    if not has_permission_cached("Document", "read"):
         frappe.throw(_("Not permitted to read documents"))
 
     # Prepare filters
-    if not filters:
-        filters = {}
+    filters = frappe.parse_json(filters) if filters else {}
 
     # Apply security level filtering based on user role
-    if not frappe.has_role("System Manager"):
+    if not is_system_manager():
         filters["security_level"] = ["in", ["Public", "Internal"]]
 
     # Prepare fields
-    if not fields:
+    if fields:
+        fields = frappe.parse_json(fields)
+    else:
         fields = ["name", "title", "document_type", "status", "security_level", "owner", "creation_date", "last_modified"]
 
-    # Search in title and description
-    or_filters = [
-        ["Document", "title", "like", f"%{query}%"],
-        ["Document", "description", "like", f"%{query}%"]
-    ]
-
-    # Get documents
-    documents = frappe.get_all("Document",
-        filters=filters,
-        or_filters=or_filters,
-        fields=fields,
-        order_by="modified desc",
-        limit=limit
-    )
+    limit = cint(limit) or 20
+    words = re.findall(r"\w+", query or "")
+
+    # Words shorter than the FULLTEXT minimum token size are not indexed,
+    # so those queries fall back to a LIKE scan
+    if not words or min(len(word) for word in words) < FULLTEXT_MIN_WORD_LENGTH:
+        documents = frappe.get_all("Document",
+            filters=filters,
+            or_filters=[
+                ["Document", "title", "like", like_pattern(query)],
+                ["Document", "description", "like", like_pattern(query)]
+            ],
+            fields=fields,
+            order_by="modified desc",
+            limit=limit
+        )
+    else:
+        # Only known columns may be interpolated into the query
+        valid_columns = frappe.get_meta("Document").get_valid_columns()
+        for fieldname in list(fields) + list(filters):
+            if fieldname not in valid_columns:
+                frappe.throw(_("Invalid field: {0}").format(fieldname))
+
+        conditions, values = frappe.db.build_conditions(filters)
+        # Require every word, matching it as a prefix
+        values["search_terms"] = " ".join(f"+{word}*" for word in words)
+        values["limit"] = limit
+
+        documents = frappe.db.sql("""
+            SELECT {fields}
+            FROM `tabDocument`
+            WHERE MATCH(title, description) AGAINST (%(search_terms)s IN BOOLEAN MODE)
+            {conditions}
+            ORDER BY MATCH(title, description) AGAINST (%(search_terms)s IN BOOLEAN MODE) DESC, modified DESC
+            LIMIT %(limit)s
+        """.format(
+            fields=", ".join(f"`{fieldname}`" for fieldname in fields),
+            conditions=f"AND {conditions}" if conditions else ""
+        ), values, as_dict=True)
 
     return {
         "documents": documents,
@@ -280,11 +362,11 @@ def upload_attachment(document_name, file_url, file_name=None):
     Upload an attachment to a document
     """
     # Check if user has permission to write this document
-    if not frappe.has_permission("Document", "write", document_name):
+    if not has_permission_cached("Document", "write", document_name):
         frappe.throw(_("Not permitted to update document: {0}").format(document_name))
 
-    # Get the document
-    doc = frappe.get_doc("Document", document_name)
+    # Only the security level is needed to decide the file's privacy
+    security_level = frappe.db.get_value("Document", document_name, "security_level")
 
     # Create file record
     file_doc = frappe.get_doc({
@@ -293,19 +375,20 @@ def upload_attachment(document_name, file_url, file_name=None):
         "file_name": file_name or file_url.split("/")[-1],
         "attached_to_doctype": "Document",
         "attached_to_name": document_name,
-        "is_private": 1 if doc.security_level in ["Confidential", "Secret"] else 0
+        "is_private": 1 if security_level in ["Confidential", "Secret"] else 0
     })
     file_doc.insert()
 
     # Log the attachment
-    frappe.get_doc("Audit Log").log_action(
-        document_name=doc.name,
+    log_action(
+        document_name=document_name,
         action="Attachment Added",
         details=f"File '{file_doc.file_name}' attached to document"
     )
 
-    # Create a new version of the document with the attachment
-    doc.create_version(f"Attachment added: {file_doc.file_name}")
+    # Create a new version of the document with the attachment; the full
+    # document is loaded only here, after the file has been stored
+    frappe.get_doc("Document", document_name).create_version(f"Attachment added: {file_doc.file_name}")
 
     return {
         "status": "success",
@@ -318,19 +401,18 @@ def download_attachment(file_name):
     """
     Download an attachment from a document
     """
-    # Get the file
-    file_doc = frappe.get_doc("File", file_name)
+    # Read only the file fields this endpoint needs
+    file_doc = frappe.db.get_value("File", file_name, ["attached_to_name", "file_url", "file_name"], as_dict=True)
+    if not file_doc:
+        frappe.throw(_("File {0} not found").format(file_name), frappe.DoesNotExistError)
 
     # Check if user has permission to read the document this file is attached to
-    if not frappe.has_permission("Document", "read", file_doc.attached_to_name):
+    if not has_permission_cached("Document", "read", file_doc.attached_to_name):
         frappe.throw(_("Not permitted to access this file"))
 
-    # Get the document to check security level
-    doc = frappe.get_doc("Document", file_doc.attached_to_name)
-
     # Log the download
-    frappe.get_doc("Audit Log").log_action(
-        document_name=doc.name,
+    log_action(
+        document_name=file_doc.attached_to_name,
         action="Attachment Downloaded",
         details=f"File '{file_doc.file_name}' downloaded by {frappe.session.user}"
     )
@@ -344,29 +426,15 @@ def validate_status_transition(old_status, new_status):
     """
     Validate that status transitions are allowed
     """
-    valid_transitions = {
-        "Draft": ["In Review", "Archived"],
-        "In Review": ["Approved", "Rejected", "Draft"],
-        "Approved": ["Published", "Draft"],
-        "Rejected": ["Draft", "Archived"],
-        "Published": ["Archived"],
-        "Archived": []
-    }
-
-    if new_status not in valid_transitions.get(old_status, []):
+    if new_status not in VALID_STATUS_TRANSITIONS.get(old_status, frozenset()):
         frappe.throw(_("Cannot change status from {0} to {1}").format(old_status, new_status))
 
-def should_create_version(old_values, new_values):
+def should_create_version(old_values, doc):
     """
     Check if changes are significant enough to create a new version
     """
-    significant_fields = ["title", "description", "document_type"]
-
-    for field in significant_fields:
-        if old_values.get(field) != new_values.get(field):
-            return True
-
-    return False
+    return (old_values["title"], old_values["description"], old_values["document_type"]) != (
+        doc.title, doc.description, doc.document_type)
 
 def send_document_notification(document_name, event):
     """
@@ -381,12 +449,12 @@ def send_document_notification(document_name, event):
         # Notify document owner
         recipients.append(doc.owner)
 
-        # Notify system managers
-        system_managers = frappe.get_all("User",
-            filters={"role_profile_name": "System Manager"},
-            fields=["name"]
-        )
-        recipients.extend([sm.name for sm in system_managers])
+        # Notify enabled users holding the System Manager role
+        recipients.extend(frappe.db.sql_list("""
+            SELECT DISTINCT parent FROM `tabHas Role`
+            WHERE role = %s AND parenttype = 'User'
+                AND parent IN (SELECT name FROM `tabUser` WHERE enabled = 1)
+        """, "System Manager"))
 
     elif event == "status_changed_to_in_review":
         # Notify reviewers based on document type
@@ -401,90 +469,90 @@ def send_document_notification(document_name, event):
         # Notify document owner
         recipients.append(doc.owner)
 
-    # Remove duplicates
-    recipients = list(set(recipients))
-
-    # Send notifications
-    for recipient in recipients:
-        # Create notification
-        notification = frappe.get_doc({
-            "doctype": "Notification Log",
-            "subject": get_notification_subject(doc, event),
-            "for_user": recipient,
-            "type": "Alert",
-            "document_type": "Document",
-            "document_name": doc.name,
-            "email_content": get_notification_content(doc, event)
-        })
-        notification.insert(ignore_permissions=True)
-
-def get_notification_subject(doc, event):
-    """
-    Get notification subject based on event
-    """
-    subjects = {
-        "created": _("New Document Created: {0}").format(doc.title),
-        "status_changed_to_in_review": _("Document Submitted for Review: {0}").format(doc.title),
-        "status_changed_to_approved": _("Document Approved: {0}").format(doc.title),
-        "status_changed_to_rejected": _("Document Rejected: {0}").format(doc.title),
-        "status_changed_to_published": _("Document Published: {0}").format(doc.title),
-        "status_changed_to_archived": _("Document Archived: {0}").format(doc.title)
-    }
-
-    return subjects.get(event, _("Document Update: {0}").format(doc.title))
+    # Create all notifications with a single insert
+    NotificationLog.create_notifications(
+        recipients,
+        subject=get_notification_subject(doc, event),
+        email_content=get_notification_content(doc, event),
+        document_type="Document",
+        document_name=doc.name
+    )
 
-def get_notification_content(doc, event):
-    """
-    Get notification content based on event
-    """
-    contents = {
-        "created": _("""
+# Notification templates keyed by event, with the document fields that fill
+# their placeholders. Only the template for the requested event is translated
+# and formatted.
+NOTIFICATION_SUBJECTS = {
+    "created": "New Document Created: {0}",
+    "status_changed_to_in_review": "Document Submitted for Review: {0}",
+    "status_changed_to_approved": "Document Approved: {0}",
+    "status_changed_to_rejected": "Document Rejected: {0}",
+    "status_changed_to_published": "Document Published: {0}",
+    "status_changed_to_archived": "Document Archived: {0}"
+}
+
+NOTIFICATION_CONTENTS = {
+    "created": ("""
             <p>A new document has been created:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p><strong>Owner:</strong> {2}</p>
             <p><strong>Security Level:</strong> {3}</p>
             <p>You can view the document <a href="/app/document/{4}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name),
+        """, ("title", "document_type", "owner", "security_level", "name")),
 
-        "status_changed_to_in_review": _("""
+    "status_changed_to_in_review": ("""
             <p>A document has been submitted for review:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p><strong>Owner:</strong> {2}</p>
             <p><strong>Security Level:</strong> {3}</p>
             <p>Please review the document <a href="/app/document/{4}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name),
+        """, ("title", "document_type", "owner", "security_level", "name")),
 
-        "status_changed_to_approved": _("""
+    "status_changed_to_approved": ("""
             <p>Your document has been approved:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p>You can view the document <a href="/app/document/{2}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.name),
+        """, ("title", "document_type", "name")),
 
-        "status_changed_to_rejected": _("""
+    "status_changed_to_rejected": ("""
             <p>Your document has been rejected:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p>Please review and make necessary changes. You can view the document <a href="/app/document/{2}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.name),
+        """, ("title", "document_type", "name")),
 
-        "status_changed_to_published": _("""
+    "status_changed_to_published": ("""
             <p>A document has been published:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p><strong>Owner:</strong> {2}</p>
             <p>You can view the document <a href="/app/document/{3}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.owner, doc.name),
+        """, ("title", "document_type", "owner", "name")),
 
-        "status_changed_to_archived": _("""
+    "status_changed_to_archived": ("""
             <p>A document has been archived:</p>
             <p><strong>Title:</strong> {0}</p>
             <p><strong>Type:</strong> {1}</p>
             <p><strong>Owner:</strong> {2}</p>
             <p>You can view the document <a href="/app/document/{3}">here</a>.</p>
-        """).format(doc.title, doc.document_type, doc.owner, doc.name)
-    }
+        """, ("title", "document_type", "owner", "name"))
+}
+
+def get_notification_subject(doc, event):
+    """
+    Get notification subject based on event
+    """
+    subject = NOTIFICATION_SUBJECTS.get(event, "Document Update: {0}")
+    return _(subject).format(doc.title)
+
+def get_notification_content(doc, event):
+    """
+    Get notification content based on event
+    """
+    if event not in NOTIFICATION_CONTENTS:
+        return _("Document {0} has been updated. You can view it <a href='/app/document/{1}'>here</a>.").format(doc.title, doc.name)
 
-    return contents.get(event, _("Document {0} has been updated. You can view it <a href='/app/document/{1}'>here</a>.").format(doc.title, doc.name))
+    template, fields = NOTIFICATION_CONTENTS[event]
+    return _(template).format(*(doc.get(field) for field in fields))
@@ -1,9 +1,37 @@
 import frappe
 from frappe import _
+from frappe.utils import cint
 from frappe.model.document import Document
 import json
 from datetime import datetime, timedelta
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition, get_document_types_with_workflow
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import get_history
+from pwp_project.pwp_project.doctype.workflow_instance.workflow_instance import parse_detail_sections
 from pwp_project.pwp_project.workflow import WorkflowRouting, WorkflowStateMachine, WorkflowState, WorkflowActions, WorkflowNotifications
+from pwp_project.pwp_project.workflow.state_machine import ACTIVE_WORKFLOW_STATUSES
+
+# Field types offered when building workflow conditions
+CONDITION_FIELDTYPES = frozenset({
+    "Data", "Link", "Select", "Check", "Date", "Datetime", "Time", "Int", "Float", "Percent", "Currency"
+})
+ASSIGNEE_FIELDTYPES = frozenset({"Link", "Select"})
+ASSIGNEE_FIELD_OPTIONS = frozenset({"User", "Role"})
+
+# Default number of history entries returned with instance details
+HISTORY_PAGE_LENGTH = 50
+
+# Scalar fields read by the workflow checks that do not change the instance
+LIGHT_INSTANCE_FIELDS = ["name", "document", "workflow_definition", "current_step", "status", "started_by", "owner", "creation"]
+
+def _load_instance_light(workflow_instance_name):
+    """
+    Load the scalar fields of a Workflow Instance without building the document
+    """
+    workflow_instance = frappe.db.get_value("Workflow Instance", workflow_instance_name, LIGHT_INSTANCE_FIELDS, as_dict=True)
+    if not workflow_instance:
+        frappe.throw(_("Workflow Instance {0} not found").format(workflow_instance_name), frappe.DoesNotExistError)
+
+    return workflow_instance
 
 @frappe.whitelist()
 def start_workflow(document_name, workflow_definition=None):
@@ -11,16 +39,20 @@ def start_workflow(document_name, workflow_definition=None):
     Start a workflow for a document
     """
     if not workflow_definition:
-        document = frappe.get_doc("Document", document_name)
-        workflow_definition = frappe.db.get_value("Document Type", document.document_type, "workflow")
+        # Most document types have no workflow; skip the lookups for those
+        document_type = frappe.db.get_value("Document", document_name, "document_type")
+        if document_type in get_document_types_with_workflow():
+            workflow_definition = frappe.db.get_value("Document Type", document_type, "workflow")
 
     if not workflow_definition:
         frappe.throw(_("No workflow definition found for document {0}").format(document_name))
 
-    existing_workflow = frappe.db.exists("Workflow Instance", {
-        "document": document_name,
-        "status": ["in", ["Pending", "In Progress", "On Hold"]]
-    })
+    existing_workflow = frappe.db.sql("""
+        SELECT name
+        FROM `tabWorkflow Instance`
+        WHERE document = %s AND status IN %s
+        LIMIT 1
+    """, (document_name, ACTIVE_WORKFLOW_STATUSES))
 
     if existing_workflow:
         frappe.throw(_("Workflow already exists for document {0}").format(document_name))
@@ -35,8 +67,14 @@ def start_workflow(document_name, workflow_definition=None):
     workflow_instance.save()
     workflow_instance.submit()
 
-    # Notify workflow started
-    WorkflowNotifications.notify_workflow_started(workflow_instance)
+    # Notify workflow started once the instance is committed
+    frappe.enqueue(
+        "pwp_project.api.workflow.send_workflow_started_notification",
+        queue="short",
+        workflow_instance_name=workflow_instance.name,
+        enqueue_after_commit=True,
+        now=frappe.flags.in_test
+    )
 
     return workflow_instance.name
 
@@ -50,27 +88,53 @@ def execute_workflow_action(workflow_instance, action_name, comment=None, to_ste
     # Execute the action
     status = WorkflowActions.execute_action(wf_instance, action_name, frappe.session.user, comment, to_step)
 
-    # Notify workflow action
-    WorkflowNotifications.notify_workflow_action(wf_instance, action_name, frappe.session.user, comment)
+    # Notify workflow action once the change is committed; the job gets the
+    # instance state as it stands after the action instead of reloading it
+    frappe.enqueue(
+        "pwp_project.api.workflow.send_workflow_action_notification",
+        queue="short",
+        workflow_instance=frappe._dict({field: wf_instance.get(field) for field in LIGHT_INSTANCE_FIELDS}),
+        action=action_name,
+        user=frappe.session.user,
+        comment=comment,
+        enqueue_after_commit=True,
+        now=frappe.flags.in_test
+    )
 
     return status
 
+def send_workflow_started_notification(workflow_instance_name):
+    """
+    Notify the start step assignees of a new workflow (background job)
+    """
+    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    WorkflowNotifications.notify_workflow_started(workflow_instance)
+
+def send_workflow_action_notification(workflow_instance, action, user, comment=None):
+    """
+    Notify the recipients of a workflow action (background job)
+    """
+    WorkflowNotifications.notify_workflow_action(workflow_instance, action, user, comment)
+
 @frappe.whitelist()
 def get_workflow_status(document_name):
     """
     Get the workflow status for a document
     """
-    workflow_instance = frappe.db.get_value("Workflow Instance", {
-        "document": document_name,
-        "status": ["in", ["Pending", "In Progress", "On Hold"]]
-    }, ["name", "status", "current_step", "workflow_definition"])
+    workflow_instance = frappe.db.sql("""
+        SELECT name, status, current_step, workflow_definition
+        FROM `tabWorkflow Instance`
+        WHERE document = %s AND status IN %s
+        LIMIT 1
+    """, (document_name, ACTIVE_WORKFLOW_STATUSES))
 
     if workflow_instance:
+        name, status, current_step, workflow_definition = workflow_instance[0]
         return {
-            "workflow_instance": workflow_instance[0],
-            "status": workflow_instance[1],
-            "current_step": workflow_instance[2],
-            "workflow_definition": workflow_instance[3]
+            "workflow_instance": name,
+            "status": status,
+            "current_step": current_step,
+            "workflow_definition": workflow_definition
         }
 
     return None
@@ -85,13 +149,32 @@ def get_pending_actions(user=None):
 
     pending_actions = []
 
-    workflow_instances = frappe.get_all("Workflow Instance", {
-        "status": "In Progress"
-    }, ["name", "document", "workflow_definition", "current_step"])
-
+    # Narrow to instances whose current step the user may be assigned to and
+    # that have an action open to one of their roles; field-based and dynamic
+    # assignees and action conditions are still checked in Python below
+    user_roles = tuple(frappe.get_roles(user))
+    workflow_instances = frappe.db.sql("""
+        SELECT DISTINCT wi.name, wi.document, wi.workflow_definition, wi.current_step, wi.status
+        FROM `tabWorkflow Instance` wi
+        INNER JOIN `tabWorkflow Step` ws
+            ON ws.parent = wi.workflow_definition
+            AND ws.parenttype = 'Workflow Definition'
+            AND ws.step_order = wi.current_step
+        INNER JOIN `tabWorkflow Step Action` wsa
+            ON wsa.parent = ws.name
+            AND wsa.parenttype = 'Workflow Step'
+        WHERE wi.status = 'In Progress'
+            AND (
+                ws.assignee_type IN ('Field-based', 'Dynamic')
+                OR (ws.assignee_type = 'Role' AND ws.assignee_value IN %(roles)s)
+                OR (ws.assignee_type = 'User' AND ws.assignee_value = %(user)s)
+            )
+            AND (IFNULL(wsa.role, '') IN ('', 'All') OR wsa.role IN %(roles)s)
+    """, {"user": user, "roles": user_roles}, as_dict=True)
+
+    # The action checks only read scalar fields, so the rows stand in for full documents
     for wf_instance in workflow_instances:
-        instance = frappe.get_doc("Workflow Instance", wf_instance.name)
-        actions = WorkflowActions.get_available_actions(instance, user)
+        actions = WorkflowActions.get_available_actions(wf_instance, user)
 
         if actions:
             pending_actions.append({
@@ -105,12 +188,19 @@ def get_pending_actions(user=None):
     return pending_actions
 
 @frappe.whitelist()
-def get_workflow_instance_details(workflow_instance_name):
+def get_workflow_instance_details(workflow_instance_name, include=None, history_limit=HISTORY_PAGE_LENGTH, history_offset=0):
     """
     Get details of a workflow instance
+
+    `include` is a list of the optional sections to compute ("pending_actions",
+    "history"); all of them are returned when it is omitted. History is returned
+    newest first, `history_limit` entries at a time starting at `history_offset`.
     """
+    include = parse_detail_sections(include)
+    history_limit = cint(history_limit) or HISTORY_PAGE_LENGTH
+    history_offset = max(cint(history_offset), 0)
     workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
-    workflow_definition = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+    workflow_definition = get_workflow_definition(workflow_instance.workflow_definition)
 
     current_step = workflow_definition.get_step_by_order(workflow_instance.current_step)
 
@@ -123,16 +213,13 @@ def get_workflow_instance_details(workflow_instance_name):
     }
 
     # Get pending actions for current user
-    if workflow_instance.status == "In Progress" and current_step:
+    if "pending_actions" in include and workflow_instance.status == "In Progress" and current_step:
         actions = WorkflowActions.get_available_actions(workflow_instance, frappe.session.user)
         result["pending_actions"] = actions
 
-    # Get workflow history
-    history = workflow_instance.history or "[]"
-    try:
-        result["history"] = json.loads(history)
-    except:
-        result["history"] = []
+    # Get the latest workflow history entries
+    if "history" in include:
+        result["history"] = get_history(workflow_instance.name, order_by="timestamp desc", limit=history_limit, start=history_offset)
 
     return result
 
@@ -166,7 +253,7 @@ def get_workflow_timeline(workflow_instance_name):
     """
     Get the timeline of a workflow instance
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowStateMachine.get_workflow_timeline(workflow_instance)
 
 @frappe.whitelist()
@@ -174,7 +261,7 @@ def get_workflow_path(workflow_instance_name):
     """
     Get the path of a workflow instance
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     path = WorkflowRouting.get_workflow_path(workflow_instance)
 
     return [step.as_dict() for step in path]
@@ -184,7 +271,7 @@ def can_approve(workflow_instance_name):
     """
     Check if current user can approve the workflow
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowActions.can_approve(workflow_instance, frappe.session.user)
 
 @frappe.whitelist()
@@ -192,7 +279,7 @@ def can_reject(workflow_instance_name):
     """
     Check if current user can reject the workflow
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowActions.can_reject(workflow_instance, frappe.session.user)
 
 @frappe.whitelist()
@@ -200,7 +287,7 @@ def can_request_changes(workflow_instance_name):
     """
     Check if current user can request changes for the workflow
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowActions.can_request_changes(workflow_instance, frappe.session.user)
 
 @frappe.whitelist()
@@ -208,7 +295,7 @@ def can_forward(workflow_instance_name):
     """
     Check if current user can forward the workflow
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowActions.can_forward(workflow_instance, frappe.session.user)
 
 @frappe.whitelist()
@@ -216,15 +303,31 @@ def can_skip(workflow_instance_name):
     """
     Check if current user can skip the current step
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowActions.can_skip(workflow_instance, frappe.session.user)
 
+@frappe.whitelist()
+def get_user_capabilities(workflow_instance_name):
+    """
+    Check every workflow action for the current user in one call
+    """
+    workflow_instance = _load_instance_light(workflow_instance_name)
+    user = frappe.session.user
+
+    return {
+        "approve": WorkflowActions.can_approve(workflow_instance, user),
+        "reject": WorkflowActions.can_reject(workflow_instance, user),
+        "request_changes": WorkflowActions.can_request_changes(workflow_instance, user),
+        "forward": WorkflowActions.can_forward(workflow_instance, user),
+        "skip": WorkflowActions.can_skip(workflow_instance, user)
+    }
+
 @frappe.whitelist()
 def get_workflow_participants(workflow_instance_name):
     """
     Get all participants in a workflow
     """
-    workflow_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
+    workflow_instance = _load_instance_light(workflow_instance_name)
     return WorkflowNotifications.get_workflow_participants(workflow_instance)
 
 @frappe.whitelist()
@@ -257,47 +360,9 @@ def duplicate_workflow(workflow_definition_name):
     new_workflow.notify_on_timeout = workflow_definition.notify_on_timeout
     new_workflow.notify_on_escalation = workflow_definition.notify_on_escalation
 
-    # Copy steps
-    for step in workflow_definition.steps:
-        new_step = new_workflow.append('steps', {})
-        new_step.step_name = step.step_name
-        new_step.description = step.description
-        new_step.step_type = step.step_type
-        new_step.step_order = step.step_order
-        new_step.assignee_type = step.assignee_type
-        new_step.assignee_value = step.assignee_value
-        new_step.timeout_days = step.timeout_days
-        new_step.escalation_days = step.escalation_days
-        new_step.notify_on_timeout = step.notify_on_timeout
-        new_step.notify_on_escalation = step.notify_on_escalation
-        new_step.allow_skip = step.allow_skip
-        new_step.allow_reject = step.allow_reject
-        new_step.custom_script = step.custom_script
-
-        # Copy actions
-        for action in step.actions:
-            new_action = new_step.append('actions', {})
-            new_action.action_name = action.action_name
-            new_action.action_type = action.action_type
-            new_action.role = action.role
-            new_action.next_step = action.next_step
-            new_action.custom_script = action.custom_script
-
-        # Copy conditions
-        for condition in step.conditions:
-            new_condition = new_step.append('conditions', {})
-            new_condition.condition_name = condition.condition_name
-            new_condition.condition_type = condition.condition_type
-            new_condition.field_name = condition.field_name
-            new_condition.operator = condition.operator
-            new_condition.value = condition.value
-            new_condition.logical_operator = condition.logical_operator
-
-    # Copy permissions
-    for permission in workflow_definition.permissions:
-        new_permission = new_workflow.append('permissions', {})
-        new_permission.role = permission.role
-        new_permission.permission_level = permission.permission_level
+    # Copy steps (with their actions and conditions) and permissions in one assignment each
+    new_workflow.set("steps", [step.as_dict(no_default_fields=True) for step in workflow_definition.steps])
+    new_workflow.set("permissions", [permission.as_dict(no_default_fields=True) for permission in workflow_definition.permissions])
 
     new_workflow.save()
 
@@ -308,6 +373,10 @@ def activate_workflow(workflow_definition_name):
     """
     Activate a workflow definition
     """
+    # Nothing to save if the flag already has the requested value
+    if frappe.db.get_value("Workflow Definition", workflow_definition_name, "is_active") == 1:
+        return True
+
     workflow_definition = frappe.get_doc("Workflow Definition", workflow_definition_name)
     workflow_definition.is_active = 1
     workflow_definition.save()
@@ -319,6 +388,10 @@ def deactivate_workflow(workflow_definition_name):
     """
     Deactivate a workflow definition
     """
+    # Nothing to save if the flag already has the requested value
+    if frappe.db.get_value("Workflow Definition", workflow_definition_name, "is_active") == 0:
+        return True
+
     workflow_definition = frappe.get_doc("Workflow Definition", workflow_definition_name)
     workflow_definition.is_active = 0
     workflow_definition.save()
@@ -330,11 +403,12 @@ def get_assignee_options(doctype):
     """
     Get assignee options for a document type
     """
-    # Get document fields
-    document_fields = frappe.get_meta(doctype).get("fields")
-
-    # Filter for user and role fields
-    user_fields = [field for field in document_fields if field.fieldtype in ["Link", "Select"] and field.options in ["User", "Role"]]
+    # Get user and role fields
+    user_fields = [
+        {"label": field.label, "value": field.fieldname}
+        for field in frappe.get_meta(doctype).fields
+        if field.fieldtype in ASSIGNEE_FIELDTYPES and field.options in ASSIGNEE_FIELD_OPTIONS
+    ]
 
     # Get all roles
     roles = frappe.get_all("Role", {"disabled": 0}, ["name"])
@@ -343,7 +417,7 @@ def get_assignee_options(doctype):
     users = frappe.get_all("User", {"enabled": 1}, ["name", "full_name"])
 
     return {
-        "fields": [{"label": field.label, "value": field.fieldname} for field in user_fields],
+        "fields": user_fields,
         "roles": [{"label": role.name, "value": role.name} for role in roles],
         "users": [{"label": f"{user.full_name} ({user.name})", "value": user.name} for user in users]
     }
@@ -353,11 +427,8 @@ def get_document_fields(doctype):
     """
     Get fields for a document type
     """
-    document_fields = frappe.get_meta(doctype).get("fields")
-
-    # Filter for relevant field types
-    relevant_fields = [field for field in document_fields if field.fieldtype in [
-        "Data", "Link", "Select", "Check", "Date", "Datetime", "Time", "Int", "Float", "Percent", "Currency"
-    ]]
-
-    return [{"label": field.label, "value": field.fieldname, "type": field.fieldtype} for field in relevant_fields]
+    return [
+        {"label": field.label, "value": field.fieldname, "type": field.fieldtype}
+        for field in frappe.get_meta(doctype).fields
+        if field.fieldtype in CONDITION_FIELDTYPES
+    ]
@@ -80,28 +80,20 @@ doc_events = {
 		"on_update": "pwp_project.workflow.events.on_update",
 		"on_submit": "pwp_project.workflow.events.on_submit",
 		"on_cancel": "pwp_project.workflow.events.on_cancel"
+	},
+	"User": {
+		"on_update": "pwp_project.pwp_project.doctype.document.document_search.clear_document_filters_cache",
+		"on_trash": "pwp_project.pwp_project.doctype.document.document_search.clear_document_filters_cache"
 	}
 }
 
 # Scheduled Tasks
 # ---------------
-# scheduler_events = {
-# 	"all": [
-# 		"pwp_project.tasks.all"
-# 	],
-# 	"daily": [
-# 		"pwp_project.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"pwp_project.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"pwp_project.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"pwp_project.tasks.monthly"
-# 	]
-# }
+scheduler_events = {
+	"all": [
+		"pwp_project.api.digital_signature.refill_rsa_key_pool"
+	]
+}
 
 # Testing
 # -------
@@ -0,0 +1,11 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+
+def execute():
+    """Add a FULLTEXT index on Document title and description for text search"""
+    if frappe.db.has_index("tabDocument", "ft_title_desc"):
+        return
+
+    frappe.db.sql_ddl("ALTER TABLE `tabDocument` ADD FULLTEXT INDEX ft_title_desc (title, description)")
@@ -0,0 +1,19 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+from pwp_project.pwp_project.doctype.document_index.document_index import DocumentIndex
+
+def execute():
+    """Split the comma-separated Document Index tags into Document Index Tag rows"""
+    if frappe.db.count("Document Index Tag"):
+        return
+
+    entries = frappe.db.sql("""
+        SELECT name, tags
+        FROM `tabDocument Index`
+        WHERE IFNULL(tags, '') != ''
+    """, as_dict=True)
+
+    for entry in entries:
+        DocumentIndex.set_index_tags(entry.name, [tag.strip() for tag in entry.tags.split(",")])
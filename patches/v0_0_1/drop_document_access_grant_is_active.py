@@ -0,0 +1,11 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+
+def execute():
+    """Drop the stored Document Access Grant is_active flag; grants are active until expires_on"""
+    if not frappe.db.has_column("Document Access Grant", "is_active"):
+        return
+
+    frappe.db.sql_ddl("ALTER TABLE `tabDocument Access Grant` DROP COLUMN is_active")
@@ -0,0 +1,59 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import json
+import frappe
+from frappe.utils import get_datetime, now
+
+ENTRY_FIELDS = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "workflow_instance", "timestamp", "user", "action", "step", "from_state", "to_state", "description", "comment"]
+
+def execute():
+    """Move the Workflow Instance history JSON into Workflow History Entry records"""
+    if not frappe.db.has_column("Workflow Instance", "history"):
+        return
+
+    # Instances that already have entries were migrated by an earlier run
+    instances = frappe.db.sql("""
+        SELECT wi.name, wi.modified, wi.history
+        FROM `tabWorkflow Instance` wi
+        WHERE IFNULL(wi.history, '') NOT IN ('', '[]')
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabWorkflow History Entry` entry
+                WHERE entry.workflow_instance = wi.name
+            )
+    """, as_dict=True)
+
+    timestamp = now()
+    migrated = []
+    for instance in instances:
+        try:
+            history = json.loads(instance.history)
+        except json.JSONDecodeError:
+            frappe.log_error(f"Could not parse history of workflow instance {instance.name}", "Workflow History Migration")
+            continue
+
+        values = [
+            (frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator", 0,
+                instance.name,
+                get_datetime(entry.get("timestamp")) if entry.get("timestamp") else instance.modified,
+                entry.get("user"),
+                entry.get("action") or "",
+                entry.get("step"),
+                entry.get("from_state"),
+                entry.get("to_state"),
+                entry.get("description"),
+                entry.get("comment"))
+            for entry in history if isinstance(entry, dict)
+        ]
+        if values:
+            frappe.db.bulk_insert("Workflow History Entry", fields=ENTRY_FIELDS, values=values)
+        migrated.append(instance.name)
+
+    # Keep the JSON of instances that could not be parsed so it can be fixed and migrated later
+    if migrated:
+        frappe.db.sql("""
+            UPDATE `tabWorkflow Instance`
+            SET history = NULL
+            WHERE name IN %(migrated)s
+        """, {"migrated": tuple(migrated)})
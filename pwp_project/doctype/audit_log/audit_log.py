@@ -41,23 +41,7 @@ class AuditLog(Document):
         """
         Static method to create audit log entries
         """
-        if not performed_by:
-            performed_by = frappe.session.user
-        if not performed_on:
-            performed_on = frappe.utils.now()
-            
-        audit_log = frappe.get_doc({
-            "doctype": "Audit Log",
-            "document": document_name,
-            "action": action,
-            "performed_by": performed_by,
-            "performed_on": performed_on,
-            "details": details,
-            "ip_address": frappe.local.request_ip if hasattr(frappe.local, 'request_ip') else "",
-            "user_agent": frappe.local.request.headers.get('User-Agent') if hasattr(frappe.local, 'request') and hasattr(frappe.local.request, 'headers') else ""
-        })
-        audit_log.insert(ignore_permissions=True)
-        return audit_log.name
+        return log_action(document_name, action, details, performed_by, performed_on)
         
     @staticmethod
     def get_document_history(document_name, limit=50):
@@ -148,4 +132,38 @@ class AuditLog(Document):
         elif format == "json":
             return json.dumps(data, indent=2, default=str)
         else:
-            frappe.throw("Unsupported export format")
\ No newline at end of file
+            frappe.throw("Unsupported export format")
+
+AUDIT_LOG_FIELDS = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "document", "action", "details", "performed_by", "performed_on", "ip_address", "user_agent"]
+
+def log_action(document_name, action, details="", performed_by=None, performed_on=None):
+    """
+    Insert an audit log entry directly, without running the Audit Log controller
+    """
+    return log_actions([(document_name, action, details)], performed_by, performed_on)[0]
+
+def log_actions(entries, performed_by=None, performed_on=None):
+    """
+    Insert several (document, action, details) audit log entries with one INSERT
+    """
+    timestamp = frappe.utils.now()
+    user = frappe.session.user
+    performed_by = performed_by or user
+    performed_on = performed_on or timestamp
+
+    # Same request details the controller's capture_request_info records
+    ip_address = getattr(frappe.local, "request_ip", None) or ""
+    request = getattr(frappe.local, "request", None)
+    headers = getattr(request, "headers", None)
+    user_agent = (headers.get("User-Agent") or "")[:140] if headers else ""
+
+    values = [
+        (frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+            document_name, action, details, performed_by, performed_on, ip_address, user_agent)
+        for document_name, action, details in entries
+    ]
+    if values:
+        frappe.db.bulk_insert("Audit Log", fields=AUDIT_LOG_FIELDS, values=values)
+
+    return [row[0] for row in values]
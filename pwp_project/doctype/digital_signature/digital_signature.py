@@ -6,17 +6,58 @@ from frappe.model.document import Document
 import json
 import base64
 import hashlib
+import mmap
 import os
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, ec
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import utils
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 import binascii
 import datetime
+import warnings
+from contextlib import contextmanager
+from functools import lru_cache
+from frappe.utils.file_manager import get_file_path
+
+try:
+    # Optional libsecp256k1 binding for faster secp256k1 verification
+    import coincurve
+except ImportError:
+    coincurve = None
+
+# Size of the slices fed to the running document hash
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Order of the secp256k1 group, used to normalise signatures to low-S form
+SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+# scrypt cost parameters for new private key encryption (about 32 MiB per derivation);
+# they are stored with each ciphertext so they can be raised without breaking old keys
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_PREFIX = "scrypt"
+
+# Iteration count of the PBKDF2 format used before scrypt
+LEGACY_PBKDF2_ITERATIONS = 100000
+
+# Number of parsed PEM keys kept per process
+PEM_KEY_CACHE_SIZE = 256
+
+@lru_cache(maxsize=PEM_KEY_CACHE_SIZE)
+def _parse_private_key(private_key_pem):
+    """Parse an unencrypted PEM private key, reusing earlier parses of the same PEM"""
+    return serialization.load_pem_private_key(private_key_pem, password=None, backend=default_backend())
+
+@lru_cache(maxsize=PEM_KEY_CACHE_SIZE)
+def _parse_public_key(public_key_pem):
+    """Parse a PEM public key, reusing earlier parses of the same PEM"""
+    return serialization.load_pem_public_key(public_key_pem, backend=default_backend())
 
 class DigitalSignature(Document):
     def validate(self):
@@ -40,6 +81,13 @@ class DigitalSignature(Document):
         Generate RSA key pair for digital signatures
         Returns: tuple (private_key_pem, public_key_pem)
         """
+        if key_size < 2048:
+            warnings.warn(
+                f"RSA keys smaller than 2048 bits are deprecated (requested {key_size})",
+                DeprecationWarning,
+                stacklevel=2
+            )
+
         try:
             # Generate private key
             private_key = rsa.generate_private_key(
@@ -74,8 +122,6 @@ class DigitalSignature(Document):
         Returns: tuple (private_key_pem, public_key_pem)
         """
         try:
-            from cryptography.hazmat.primitives.asymmetric import ec
-
             # Map curve names to cryptography curve objects
             curve_map = {
                 'secp256r1': ec.SECP256R1(),
@@ -118,12 +164,13 @@ class DigitalSignature(Document):
         Load private key from PEM format
         """
         try:
-            if password:
-                password = password.encode('utf-8')
+            # Password-protected keys are parsed each time so passwords never sit in the cache
+            if not password:
+                return _parse_private_key(private_key_pem.encode('utf-8'))
 
             private_key = serialization.load_pem_private_key(
                 private_key_pem.encode('utf-8'),
-                password=password,
+                password=password.encode('utf-8'),
                 backend=default_backend()
             )
             return private_key
@@ -131,17 +178,22 @@ class DigitalSignature(Document):
             frappe.log_error(f"Private key loading failed: {str(e)}", "Digital Signature Key Loading")
             raise frappe.ValidationError(f"Failed to load private key: {str(e)}")
 
+    @staticmethod
+    def get_key_algorithm(private_key_pem, password=None):
+        """
+        Detect the signing algorithm of a private key
+        Returns: 'RSA' or 'ECDSA'
+        """
+        private_key = DigitalSignature.load_private_key(private_key_pem, password)
+        return 'RSA' if isinstance(private_key, rsa.RSAPrivateKey) else 'ECDSA'
+
     @staticmethod
     def load_public_key(public_key_pem):
         """
         Load public key from PEM format
         """
         try:
-            public_key = serialization.load_pem_public_key(
-                public_key_pem.encode('utf-8'),
-                backend=default_backend()
-            )
-            return public_key
+            return _parse_public_key(public_key_pem.encode('utf-8'))
         except Exception as e:
             frappe.log_error(f"Public key loading failed: {str(e)}", "Digital Signature Key Loading")
             raise frappe.ValidationError(f"Failed to load public key: {str(e)}")
@@ -183,7 +235,6 @@ class DigitalSignature(Document):
         Returns: base64 encoded signature
         """
         try:
-            from cryptography.hazmat.primitives.asymmetric import ec
             private_key = DigitalSignature.load_private_key(private_key_pem, password)
 
             # Convert data to bytes if it's a string
@@ -203,6 +254,44 @@ class DigitalSignature(Document):
             frappe.log_error(f"ECDSA signing failed: {str(e)}", "Digital Signature Signing")
             raise frappe.ValidationError(f"Failed to sign data with ECDSA: {str(e)}")
 
+    @staticmethod
+    def hash_document_content(document_content):
+        """
+        Compute the SHA-256 hex digest of document content (str, bytes or binary file)
+        hashlib hashes through OpenSSL, which uses SHA extensions where the CPU has them
+        """
+        digest = hashlib.sha256()
+
+        if hasattr(document_content, 'read'):
+            document_content.seek(0)
+            try:
+                # Map files into memory so slices are hashed without copying them into Python
+                content = mmap.mmap(document_content.fileno(), 0, access=mmap.ACCESS_READ)
+            except (AttributeError, OSError, ValueError):
+                # Not backed by a mappable file (or empty); stream it instead
+                for chunk in iter(lambda: document_content.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                return digest.hexdigest()
+
+            with content:
+                DigitalSignature.update_digest(digest, content)
+            return digest.hexdigest()
+
+        if isinstance(document_content, str):
+            document_content = document_content.encode('utf-8')
+
+        DigitalSignature.update_digest(digest, document_content)
+        return digest.hexdigest()
+
+    @staticmethod
+    def update_digest(digest, content):
+        """
+        Feed a bytes-like object to a hashlib digest in HASH_CHUNK_SIZE memoryview slices
+        """
+        with memoryview(content) as view:
+            for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+
     @staticmethod
     def create_document_signature(private_key_pem, document_content, algorithm='RSA', password=None):
         """
@@ -211,10 +300,7 @@ class DigitalSignature(Document):
         """
         try:
             # Generate document hash
-            if isinstance(document_content, str):
-                document_hash = hashlib.sha256(document_content.encode('utf-8')).hexdigest()
-            else:
-                document_hash = hashlib.sha256(document_content).hexdigest()
+            document_hash = DigitalSignature.hash_document_content(document_content)
 
             # Create signature based on algorithm
             if algorithm.upper() == 'RSA':
@@ -280,7 +366,6 @@ class DigitalSignature(Document):
         Returns: boolean (True if valid, False otherwise)
         """
         try:
-            from cryptography.hazmat.primitives.asymmetric import ec
             public_key = DigitalSignature.load_public_key(public_key_pem)
 
             # Convert data to bytes if it's a string
@@ -290,6 +375,9 @@ class DigitalSignature(Document):
             # Decode signature from base64
             signature = base64.b64decode(signature_b64)
 
+            if coincurve and isinstance(getattr(public_key, "curve", None), ec.SECP256K1):
+                return DigitalSignature.verify_signature_secp256k1(public_key, data, signature)
+
             # Verify signature
             public_key.verify(
                 signature,
@@ -305,6 +393,27 @@ class DigitalSignature(Document):
             frappe.log_error(f"ECDSA signature verification failed: {str(e)}", "Digital Signature Verification")
             raise frappe.ValidationError(f"Failed to verify ECDSA signature: {str(e)}")
 
+    @staticmethod
+    def verify_signature_secp256k1(public_key, data, signature):
+        """
+        Verify a DER-encoded secp256k1 ECDSA signature with libsecp256k1 (coincurve)
+        Returns: boolean (True if valid, False otherwise)
+        """
+        try:
+            r, s = utils.decode_dss_signature(signature)
+        except ValueError:
+            return False
+
+        # libsecp256k1 only accepts low-S signatures, OpenSSL produces either form
+        if s > SECP256K1_ORDER // 2:
+            s = SECP256K1_ORDER - s
+
+        point = public_key.public_bytes(
+            encoding=serialization.Encoding.X962,
+            format=serialization.PublicFormat.CompressedPoint
+        )
+        return coincurve.PublicKey(point).verify(utils.encode_dss_signature(r, s), data)
+
     @staticmethod
     def verify_document_signature(public_key_pem, document_content, signature_metadata):
         """
@@ -321,10 +430,7 @@ class DigitalSignature(Document):
                 raise ValueError("Invalid signature metadata")
 
             # Verify document hash matches
-            if isinstance(document_content, str):
-                current_hash = hashlib.sha256(document_content.encode('utf-8')).hexdigest()
-            else:
-                current_hash = hashlib.sha256(document_content).hexdigest()
+            current_hash = DigitalSignature.hash_document_content(document_content)
 
             if current_hash != document_hash:
                 return False
@@ -376,10 +482,6 @@ class DigitalSignature(Document):
         Verify the digital signature using proper cryptographic verification
         """
         try:
-            # Get the document and its content
-            document = frappe.get_doc("Document", self.document)
-            document_content = document.get_file_content() if hasattr(document, 'get_file_content') else str(document)
-
             # Parse signature data
             try:
                 signature_metadata = json.loads(self.signature_data)
@@ -388,11 +490,12 @@ class DigitalSignature(Document):
                 try:
                     decoded_signature = base64.b64decode(self.signature_data).decode('utf-8')
                     signature_metadata = json.loads(decoded_signature)
-                except:
-                    # If all parsing fails, create a simple metadata structure
+                except ValueError:
+                    # Bad base64, non-UTF-8 bytes and invalid JSON all raise ValueError subclasses.
+                    # If all parsing fails, create a simple metadata structure;
+                    # the document hash is filled in from the current content below
                     signature_metadata = {
                         "algorithm": "RSA",
-                        "document_hash": hashlib.sha256(document_content.encode('utf-8')).hexdigest(),
                         "signature": self.signature_data
                     }
 
@@ -411,7 +514,8 @@ class DigitalSignature(Document):
                         cert_info = json.loads(self.certificate_info)
                         if 'public_key' in cert_info:
                             public_key = cert_info['public_key']
-                    except:
+                    except (ValueError, TypeError):
+                        # Malformed or non-object certificate info carries no key
                         pass
 
                 if not public_key:
@@ -419,12 +523,16 @@ class DigitalSignature(Document):
             else:
                 frappe.throw(f"Unsupported signature provider: {self.signature_provider}")
 
-            # Verify the signature
-            is_valid = DigitalSignature.verify_document_signature(
-                public_key,
-                document_content,
-                signature_metadata
-            )
+            # Verify the signature against the content it was made over
+            with self.open_signed_content(signature_metadata) as document_content:
+                if "document_hash" not in signature_metadata:
+                    signature_metadata["document_hash"] = DigitalSignature.hash_document_content(document_content)
+
+                is_valid = DigitalSignature.verify_document_signature(
+                    public_key,
+                    document_content,
+                    signature_metadata
+                )
 
             if is_valid:
                 self.verification_status = "Verified"
@@ -442,6 +550,36 @@ class DigitalSignature(Document):
             self.verification_status = "Failed"
             self.save()
 
+    def get_signed_content_source(self):
+        """
+        Describe the content a new signature covers: the document's attachment when
+        it is stored on this site, else the document text
+        """
+        document = frappe.get_doc("Document", self.document)
+        file_path = get_file_path(document.attachments) if document.attachments else None
+
+        if file_path and os.path.isfile(file_path):
+            return {"content": "attachment", "file_url": document.attachments}
+
+        return {"content": "document"}
+
+    @contextmanager
+    def open_signed_content(self, source):
+        """
+        Yield the content described by source (see get_signed_content_source): a binary
+        file handle on the recorded attachment, or the document text when source does
+        not name one (signatures made before the source was recorded)
+        """
+        if source.get("content") == "attachment":
+            file_path = get_file_path(source.get("file_url")) if source.get("file_url") else None
+            if not file_path or not os.path.isfile(file_path):
+                frappe.throw(f"Signed attachment not found: {source.get('file_url')}")
+
+            with open(file_path, "rb") as document_file:
+                yield document_file
+        else:
+            yield str(frappe.get_doc("Document", self.document))
+
     def extract_certificate_info(self):
         """
         Extract certificate information from signature data
@@ -484,23 +622,27 @@ class DigitalSignature(Document):
             frappe.log_error(f"Certificate extraction failed: {str(e)}", "Digital Signature Certificate")
             return ""
 
-    def sign_document(self, private_key_pem, algorithm='RSA', password=None):
+    def sign_document(self, private_key_pem, algorithm=None, password=None):
         """
         Create a digital signature for the associated document
         Returns: dict with signature metadata
         """
         try:
-            # Get the document content
-            document = frappe.get_doc("Document", self.document)
-            document_content = document.get_file_content() if hasattr(document, 'get_file_content') else str(document)
-
-            # Create the signature
-            signature_metadata = DigitalSignature.create_document_signature(
-                private_key_pem,
-                document_content,
-                algorithm,
-                password
-            )
+            if not algorithm:
+                algorithm = DigitalSignature.get_key_algorithm(private_key_pem, password)
+
+            # Create the signature, streaming the document content
+            content_source = self.get_signed_content_source()
+            with self.open_signed_content(content_source) as document_content:
+                signature_metadata = DigitalSignature.create_document_signature(
+                    private_key_pem,
+                    document_content,
+                    algorithm,
+                    password
+                )
+
+            # Record what was hashed so verification reads the same content
+            signature_metadata.update(content_source)
 
             # Store the signature data as JSON
             self.signature_data = json.dumps(signature_metadata)
@@ -577,18 +719,19 @@ class DigitalSignature(Document):
     def encrypt_private_key(private_key_pem, password):
         """
         Encrypt a private key with a password for secure storage
-        Returns: encrypted private key (base64 encoded)
+        Returns: "scrypt$<n>$<r>$<p>$" followed by the base64 encoded salt, IV and ciphertext
         """
         try:
             # Generate a random salt
             salt = os.urandom(16)
 
-            # Generate key from password using PBKDF2
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
+            # Derive the key from the password using scrypt
+            kdf = Scrypt(
                 salt=salt,
-                iterations=100000,
+                length=32,
+                n=SCRYPT_N,
+                r=SCRYPT_R,
+                p=SCRYPT_P,
                 backend=default_backend()
             )
             key = kdf.derive(password.encode('utf-8'))
@@ -608,8 +751,11 @@ class DigitalSignature(Document):
             # Combine salt, IV, and encrypted key
             encrypted_data = salt + iv + encrypted_private_key
 
-            # Return base64 encoded encrypted data
-            return base64.b64encode(encrypted_data).decode('utf-8')
+            # Return the KDF parameters with the base64 encoded encrypted data
+            return "$".join([
+                SCRYPT_PREFIX, str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+                base64.b64encode(encrypted_data).decode('utf-8')
+            ])
 
         except Exception as e:
             frappe.log_error(f"Private key encryption failed: {str(e)}", "Digital Signature Key Encryption")
@@ -618,26 +764,35 @@ class DigitalSignature(Document):
     @staticmethod
     def decrypt_private_key(encrypted_private_key_b64, password):
         """
-        Decrypt an encrypted private key
+        Decrypt an encrypted private key (scrypt format, or the older bare base64 PBKDF2 format)
         Returns: decrypted private key (PEM format)
         """
         try:
-            # Decode from base64
-            encrypted_data = base64.b64decode(encrypted_private_key_b64)
-
-            # Extract salt, IV, and encrypted key
-            salt = encrypted_data[:16]
+            if encrypted_private_key_b64.startswith(SCRYPT_PREFIX + "$"):
+                prefix, n, r, p, encrypted_private_key_b64 = encrypted_private_key_b64.split("$")
+                encrypted_data = base64.b64decode(encrypted_private_key_b64)
+                kdf = Scrypt(
+                    salt=encrypted_data[:16],
+                    length=32,
+                    n=int(n),
+                    r=int(r),
+                    p=int(p),
+                    backend=default_backend()
+                )
+            else:
+                encrypted_data = base64.b64decode(encrypted_private_key_b64)
+                kdf = PBKDF2HMAC(
+                    algorithm=hashes.SHA256(),
+                    length=32,
+                    salt=encrypted_data[:16],
+                    iterations=LEGACY_PBKDF2_ITERATIONS,
+                    backend=default_backend()
+                )
+
+            # Extract IV and encrypted key
             iv = encrypted_data[16:32]
             encrypted_private_key = encrypted_data[32:]
 
-            # Generate key from password using PBKDF2
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-                backend=default_backend()
-            )
             key = kdf.derive(password.encode('utf-8'))
 
             # Decrypt the private key
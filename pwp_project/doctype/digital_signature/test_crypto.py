@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 # Test script for digital signature cryptographic functionality
 
+import io
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from digital_signature import DigitalSignature
@@ -173,33 +176,58 @@ def test_key_encryption():
         print(f"✗ Key encryption/decryption testing failed: {str(e)}")
         return False
 
+def _run_captured(test_function, *args):
+    """Run a test function in a worker process, returning its output and result"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = test_function(*args)
+    return output.getvalue(), result
+
 def main():
     """Run all tests"""
     print("=== Digital Signature Cryptographic Functionality Tests ===\n")
     
-    # Test RSA key generation
-    rsa_private, rsa_public = test_rsa_key_generation()
-    if not rsa_private or not rsa_public:
-        print("Cannot continue with RSA tests - key generation failed")
-        return False
-    
-    # Test ECDSA key generation
-    ecdsa_private, ecdsa_public = test_ecdsa_key_generation()
-    if not ecdsa_private or not ecdsa_public:
-        print("Cannot continue with ECDSA tests - key generation failed")
-        return False
-    
-    # Test RSA signing and verification
-    rsa_signing_success = test_rsa_signing(rsa_private, rsa_public)
-    
-    # Test ECDSA signing and verification
-    ecdsa_signing_success = test_ecdsa_signing(ecdsa_private, ecdsa_public)
-    
-    # Test document signature
-    document_signature_success = test_document_signature()
-    
-    # Test key encryption
-    key_encryption_success = test_key_encryption()
+    # The tests are independent and CPU-bound, so run them in separate processes.
+    # Each test's output is captured and printed in order once it has finished.
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        rsa_key_future = executor.submit(_run_captured, test_rsa_key_generation)
+        ecdsa_key_future = executor.submit(_run_captured, test_ecdsa_key_generation)
+        document_signature_future = executor.submit(_run_captured, test_document_signature)
+        key_encryption_future = executor.submit(_run_captured, test_key_encryption)
+        
+        # Test RSA key generation
+        output, (rsa_private, rsa_public) = rsa_key_future.result()
+        print(output, end="")
+        if not rsa_private or not rsa_public:
+            print("Cannot continue with RSA tests - key generation failed")
+            return False
+        
+        # Test ECDSA key generation
+        output, (ecdsa_private, ecdsa_public) = ecdsa_key_future.result()
+        print(output, end="")
+        if not ecdsa_private or not ecdsa_public:
+            print("Cannot continue with ECDSA tests - key generation failed")
+            return False
+        
+        # Signing tests reuse the key pairs generated above
+        rsa_signing_future = executor.submit(_run_captured, test_rsa_signing, rsa_private, rsa_public)
+        ecdsa_signing_future = executor.submit(_run_captured, test_ecdsa_signing, ecdsa_private, ecdsa_public)
+        
+        # Test RSA signing and verification
+        output, rsa_signing_success = rsa_signing_future.result()
+        print(output, end="")
+        
+        # Test ECDSA signing and verification
+        output, ecdsa_signing_success = ecdsa_signing_future.result()
+        print(output, end="")
+        
+        # Test document signature
+        output, document_signature_success = document_signature_future.result()
+        print(output, end="")
+        
+        # Test key encryption
+        output, key_encryption_success = key_encryption_future.result()
+        print(output, end="")
     
     # Summary
     print("\n=== Test Summary ===")
@@ -7,6 +7,7 @@ import json
 import base64
 from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
 from pwp_project.pwp_project.doctype.user_crypto_keys.user_crypto_keys import UserCryptoKeys
+from pwp_project.api.digital_signature import RSA_KEY_POOL_CACHE_KEY, generate_key_pair, generate_key_pairs_bulk, push_pooled_rsa_key_pair
 
 class TestDigitalSignature(unittest.TestCase):
     def setUp(self):
@@ -279,6 +280,161 @@ class TestDigitalSignature(unittest.TestCase):
 
         self.assertEqual(signature_doc.verification_status, "Verified")
 
+    def attach_test_file(self, content):
+        """Attach a private file to the test document and return its URL"""
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": "signature-test.txt",
+            "attached_to_doctype": "Document",
+            "attached_to_name": "TEST-DOC-001",
+            "is_private": 1,
+            "content": content
+        })
+        file_doc.insert()
+        self.addCleanup(frappe.delete_doc, "File", file_doc.name, ignore_permissions=True)
+
+        frappe.db.set_value("Document", "TEST-DOC-001", "attachments", file_doc.file_url)
+        return file_doc.file_url
+
+    def test_signature_survives_later_attachment(self):
+        """Test that attaching a file after signing keeps the signature valid"""
+        # Generate and store user keys
+        private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair()
+        UserCryptoKeys.store_user_keys("test@example.com", private_key_pem, public_key_pem)
+
+        signature_doc = frappe.get_doc({
+            "doctype": "Digital Signature",
+            "document": "TEST-DOC-001",
+            "signature_provider": "Internal",
+            "verification_status": "Pending"
+        })
+        signature_doc.insert()
+
+        # Sign before anything is attached: the document text is covered
+        signature_metadata = signature_doc.sign_document(private_key_pem, 'RSA')
+        self.assertEqual(signature_metadata['content'], "document")
+
+        # Attach a file afterwards and verify again
+        self.attach_test_file(b"Attached after signing")
+        signature_doc.verify_signature()
+
+        self.assertEqual(signature_doc.verification_status, "Verified")
+
+    def test_signature_covers_recorded_attachment(self):
+        """Test that a signature over an attachment is verified against that attachment"""
+        # Generate and store user keys
+        private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair()
+        UserCryptoKeys.store_user_keys("test@example.com", private_key_pem, public_key_pem)
+
+        file_url = self.attach_test_file(b"Signed attachment content")
+
+        signature_doc = frappe.get_doc({
+            "doctype": "Digital Signature",
+            "document": "TEST-DOC-001",
+            "signature_provider": "Internal",
+            "verification_status": "Pending"
+        })
+        signature_doc.insert()
+
+        signature_metadata = signature_doc.sign_document(private_key_pem, 'RSA')
+        self.assertEqual(signature_metadata['content'], "attachment")
+        self.assertEqual(signature_metadata['file_url'], file_url)
+
+        signature_doc.verify_signature()
+        self.assertEqual(signature_doc.verification_status, "Verified")
+
+    def test_signature_without_recorded_source_uses_document_text(self):
+        """Test that signatures made before the content source was recorded still verify"""
+        # Generate and store user keys
+        private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair()
+        UserCryptoKeys.store_user_keys("test@example.com", private_key_pem, public_key_pem)
+
+        signature_doc = frappe.get_doc({
+            "doctype": "Digital Signature",
+            "document": "TEST-DOC-001",
+            "signature_provider": "Internal",
+            "verification_status": "Pending"
+        })
+        signature_doc.insert()
+
+        # Old signature data: made over str(document), with no content key
+        document = frappe.get_doc("Document", "TEST-DOC-001")
+        signature_doc.signature_data = json.dumps(
+            DigitalSignature.create_document_signature(private_key_pem, str(document), 'RSA')
+        )
+
+        self.attach_test_file(b"Attached after an old signature")
+        signature_doc.verify_signature()
+
+        self.assertEqual(signature_doc.verification_status, "Verified")
+
+    def clear_rsa_key_pool(self):
+        """Empty the 2048-bit RSA key pool for the duration of the test"""
+        cache_key = RSA_KEY_POOL_CACHE_KEY.format(2048)
+        frappe.cache().delete_value(cache_key)
+        self.addCleanup(frappe.cache().delete_value, cache_key)
+        self.addCleanup(self.delete_user_keys, frappe.session.user)
+        return cache_key
+
+    def delete_user_keys(self, user_id):
+        """Remove keys stored for a user by the key generation API"""
+        if frappe.db.exists("User Crypto Keys", user_id):
+            frappe.delete_doc("User Crypto Keys", user_id)
+
+    def test_generate_key_pair_claims_pooled_pair(self):
+        """Test that RSA key generation claims a pre-generated pair from the pool"""
+        cache_key = self.clear_rsa_key_pool()
+
+        private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair()
+        push_pooled_rsa_key_pair(2048, (private_key_pem, public_key_pem))
+
+        # The pooled pair is not stored in clear
+        pooled = frappe.cache().lrange(cache_key, 0, -1)
+        self.assertEqual(len(pooled), 1)
+        self.assertNotIn(b"PRIVATE KEY", pooled[0])
+
+        result = generate_key_pair(algorithm='RSA', key_size=2048)
+
+        self.assertEqual(result['public_key'], public_key_pem)
+        self.assertEqual(UserCryptoKeys.get_user_private_key(frappe.session.user), private_key_pem)
+        self.assertEqual(frappe.cache().llen(cache_key), 0)
+
+    def test_generate_key_pair_without_pooled_pair(self):
+        """Test that RSA key generation falls back to generating inline when the pool is empty"""
+        self.clear_rsa_key_pool()
+
+        result = generate_key_pair(algorithm='RSA', key_size=2048)
+
+        self.assertIn("-----BEGIN PUBLIC KEY-----", result['public_key'])
+        self.assertEqual(UserCryptoKeys.get_user_public_key(frappe.session.user), result['public_key'])
+
+    def test_generate_key_pairs_bulk(self):
+        """Test generating and storing key pairs for several users in one job"""
+        if not frappe.db.exists("User", "test2@example.com"):
+            frappe.get_doc({
+                "doctype": "User",
+                "email": "test2@example.com",
+                "first_name": "Second",
+                "last_name": "User",
+                "username": "testuser2",
+                "enabled": 1
+            }).insert()
+        self.addCleanup(frappe.delete_doc, "User", "test2@example.com")
+        self.addCleanup(self.delete_user_keys, "test2@example.com")
+
+        user_ids = ["test@example.com", "test2@example.com"]
+        result = generate_key_pairs_bulk(json.dumps(user_ids), algorithm='ECDSA')
+
+        self.assertEqual(result['status'], "queued")
+        self.assertEqual(result['users'], user_ids)
+
+        # The job runs inline in tests; each user gets their own key pair
+        public_keys = [UserCryptoKeys.get_user_public_key(user_id) for user_id in user_ids]
+        self.assertTrue(all(public_keys))
+        self.assertNotEqual(public_keys[0], public_keys[1])
+        for user_id in user_ids:
+            self.assertEqual(frappe.db.get_value("User Crypto Keys", user_id, "key_status"), "Active")
+
 def run_tests():
     """Run all tests"""
     suite = unittest.TestLoader().loadTestsFromTestCase(TestDigitalSignature)
@@ -5,11 +5,37 @@ import frappe
 import json
 import os
 from frappe.model.document import Document
+from frappe.deferred_insert import deferred_insert
 from frappe.utils import now, getdate, add_days, cstr
 from frappe import _
+from pwp_project.pwp_project.doctype.audit_log.audit_log import log_action
+from pwp_project.pwp_project.doctype.document.document_search import clear_document_count_cache
+from pwp_project.pwp_project.doctype.document_access_grant.document_access_grant import DocumentAccessGrant
+from pwp_project.pwp_project.doctype.document_index.document_index import DocumentIndex
+from pwp_project.pwp_project.doctype.notification_log.notification_log import NotificationLog
+from pwp_project.pwp_project.utils import is_system_manager, json_dumps
+
+# Statuses a document may move to from each status
+VALID_STATUS_TRANSITIONS = {
+    "Draft": frozenset(("In Review", "Archived")),
+    "In Review": frozenset(("Approved", "Rejected", "Draft")),
+    "Approved": frozenset(("Published", "Draft")),
+    "Rejected": frozenset(("Draft", "Archived")),
+    "Published": frozenset(("Archived",)),
+    "Archived": frozenset()
+}
+
+# Document Version columns under the names the version lists and comparisons use
+VERSION_LIST_FIELDS = ["name", "version_number", "version_description as version_notes", "created_by", "version_date as created_on"]
+
+# Changes to these fields create a new version
+VERSIONED_FIELDS = ("title", "description", "document_type")
+# Fields compared against the saved document once per save
+DIFFED_FIELDS = VERSIONED_FIELDS + ("status", "document_number")
 
 class Document(Document):
     def validate(self):
+        self.snapshot_changes()
         self.update_last_modified()
         self.validate_security_level()
         self.validate_required_fields()
@@ -25,11 +51,13 @@ class Document(Document):
     def on_update(self):
         self.create_audit_log("Updated")
         self.update_index()
+        clear_document_count_cache()
         self.handle_status_change()
         
     def on_trash(self):
         self.create_audit_log("Deleted")
         self.remove_from_index()
+        clear_document_count_cache()
         
     def after_insert(self):
         # Create initial version
@@ -38,11 +66,48 @@ class Document(Document):
         self.update_index()
         self.set_default_security_level()
         
+    def _get_doc_type(self):
+        """Get the Document Type of this document, loaded at most once per document type"""
+        cached = getattr(self, "_doc_type_cache", None)
+        if not cached or cached[0] != self.document_type:
+            cached = (self.document_type, frappe.get_cached_doc("Document Type", self.document_type))
+            self._doc_type_cache = cached
+        return cached[1]
+        
+    def snapshot_changes(self):
+        """Load the saved document once and record which diffed fields changed"""
+        self._old_doc = None if self.is_new() else self.get_doc_before_save()
+        self._changed_fields = {
+            field for field in DIFFED_FIELDS
+            if self._old_doc and self._old_doc.get(field) != self.get(field)
+        }
+        
+    def db_insert(self, *args, **kwargs):
+        meta_data = self._dump_meta_data()
+        try:
+            return super().db_insert(*args, **kwargs)
+        finally:
+            self.meta_data = meta_data
+            
+    def db_update(self, *args, **kwargs):
+        meta_data = self._dump_meta_data()
+        try:
+            return super().db_update(*args, **kwargs)
+        finally:
+            self.meta_data = meta_data
+            
+    def _dump_meta_data(self):
+        """Serialize the metadata dict for writing; returns the value to restore afterwards"""
+        meta_data = self.meta_data
+        if isinstance(meta_data, dict):
+            self.meta_data = json.dumps(meta_data, default=str)
+        return meta_data
+        
     def update_last_modified(self):
         self.last_modified = frappe.utils.now()
         
     def validate_security_level(self):
-        if self.security_level == "Secret" and not frappe.has_role("System Manager"):
+        if self.security_level == "Secret" and not is_system_manager():
             frappe.throw(_("Only System Managers can create Secret level documents"))
             
     def validate_required_fields(self):
@@ -56,35 +121,23 @@ class Document(Document):
             frappe.throw(_("Document Number is required"))
             
         # Validate document type specific requirements
-        doc_type = frappe.get_doc("Document Type", self.document_type)
+        doc_type = self._get_doc_type()
         if doc_type and doc_type.require_attachment and not self.attachments:
             frappe.throw(_("This document type requires an attachment"))
             
     def validate_status_transition(self):
-        if not self.is_new():
-            old_doc = self.get_doc_before_save()
-            if old_doc and old_doc.status != self.status:
-                self._validate_status_transition(old_doc.status, self.status)
+        if "status" in self._changed_fields:
+            self._validate_status_transition(self._old_doc.status, self.status)
                 
     def _validate_status_transition(self, old_status, new_status):
-        valid_transitions = {
-            "Draft": ["In Review", "Archived"],
-            "In Review": ["Approved", "Rejected", "Draft"],
-            "Approved": ["Published", "Draft"],
-            "Rejected": ["Draft", "Archived"],
-            "Published": ["Archived"],
-            "Archived": []
-        }
-        
-        if new_status not in valid_transitions.get(old_status, []):
+        if new_status not in VALID_STATUS_TRANSITIONS.get(old_status, frozenset()):
             frappe.throw(_("Cannot change status from {0} to {1}").format(old_status, new_status))
             
     def validate_document_number(self):
         """Validate document number uniqueness"""
-        if not self.is_new() and self.has_value_changed("document_number"):
-            # Check if document number already exists
-            existing_doc = frappe.db.exists("Document", {"document_number": self.document_number})
-            if existing_doc and existing_doc != self.name:
+        if "document_number" in self._changed_fields:
+            # Check if another document already uses this number
+            if frappe.db.get_value("Document", {"document_number": self.document_number, "name": ["!=", self.name]}, "name"):
                 frappe.throw(_("Document Number {0} already exists").format(self.document_number))
                 
     def validate_expiry_date(self):
@@ -95,25 +148,33 @@ class Document(Document):
     def set_default_security_level(self):
         """Set default security level from document type"""
         if self.document_type and not self.security_level:
-            doc_type = frappe.get_doc("Document Type", self.document_type)
+            doc_type = self._get_doc_type()
             if doc_type and doc_type.default_security_level:
                 self.security_level = doc_type.default_security_level
                 
     def handle_status_change(self):
         """Handle actions when status changes"""
-        if not self.is_new():
-            old_doc = self.get_doc_before_save()
-            if old_doc and old_doc.status != self.status:
-                # Create version when status changes
-                self.create_version(f"Status changed from {old_doc.status} to {self.status}")
-                
-                # Send notifications based on status change
-                self.send_status_notifications(old_doc.status, self.status)
+        if "status" in getattr(self, "_changed_fields", ()):
+            old_status = self._old_doc.status
+            
+            # Create version when status changes
+            self.create_version(f"Status changed from {old_status} to {self.status}")
+            
+            # Send notifications based on status change once the save is committed
+            frappe.enqueue(
+                "pwp_project.pwp_project.doctype.document.document.send_status_notifications_job",
+                queue="short",
+                document_name=self.name,
+                old_status=old_status,
+                new_status=self.status,
+                enqueue_after_commit=True,
+                now=frappe.flags.in_test
+            )
                 
     def send_status_notifications(self, old_status, new_status):
         """Send notifications when status changes"""
         # Get document type to determine reviewers and approvers
-        doc_type = frappe.get_doc("Document Type", self.document_type)
+        doc_type = self._get_doc_type()
         
         if not doc_type:
             return
@@ -128,144 +189,162 @@ class Document(Document):
             
     def notify_reviewers(self, doc_type):
         """Notify reviewers that document needs review"""
-        reviewers = []
-        
-        # Get reviewers from document type
-        if doc_type.reviewers:
-            for reviewer in doc_type.reviewers:
-                if reviewer.user:
-                    reviewers.append(reviewer.user)
-                    
-        # Send notification to each reviewer
-        for reviewer in reviewers:
-            # Create notification log
-            notification = frappe.get_doc({
-                "doctype": "Notification Log",
-                "for_user": reviewer,
-                "subject": _("Document Ready for Review: {0}").format(self.title),
-                "message": _(
-                    "Document '{0}' (Number: {1}) is ready for your review. "
-                    "Please review and take appropriate action."
-                ).format(self.title, self.document_number),
-                "document_type": "Document",
-                "document_name": self.name
-            })
-            notification.insert(ignore_permissions=True)
+        self._bulk_create_notifications(
+            doc_type.get_reviewers(),
+            _("Document Ready for Review: {0}").format(self.title),
+            _(
+                "Document '{0}' (Number: {1}) is ready for your review. "
+                "Please review and take appropriate action."
+            ).format(self.title, self.document_number)
+        )
             
     def notify_approvers(self, doc_type):
         """Notify approvers that document needs approval"""
-        approvers = []
-        
-        # Get approvers from document type
-        if doc_type.approvers:
-            for approver in doc_type.approvers:
-                if approver.user:
-                    approvers.append(approver.user)
-                    
-        # Send notification to each approver
-        for approver in approvers:
-            # Create notification log
-            notification = frappe.get_doc({
-                "doctype": "Notification Log",
-                "for_user": approver,
-                "subject": _("Document Ready for Approval: {0}").format(self.title),
-                "message": _(
-                    "Document '{0}' (Number: {1}) has been reviewed and is ready for your approval. "
-                    "Please review and take appropriate action."
-                ).format(self.title, self.document_number),
-                "document_type": "Document",
-                "document_name": self.name
-            })
-            notification.insert(ignore_permissions=True)
+        self._bulk_create_notifications(
+            doc_type.get_approvers(),
+            _("Document Ready for Approval: {0}").format(self.title),
+            _(
+                "Document '{0}' (Number: {1}) has been reviewed and is ready for your approval. "
+                "Please review and take appropriate action."
+            ).format(self.title, self.document_number)
+        )
+            
+    def _bulk_create_notifications(self, users, subject, message):
+        """Create one Notification Log per user with a single INSERT"""
+        NotificationLog.create_notifications(
+            users,
+            subject,
+            email_content=message,
+            document_type="Document",
+            document_name=self.name
+        )
             
+    def get_text_content(self):
+        """Get the title and plain-text description, stripping the HTML only when they change"""
+        key = (self.title, self.description)
+        cached = getattr(self, "_text_content_cache", None)
+        if not cached or cached[0] != key:
+            text_content = self.title
+            if self.description:
+                text_content += " " + frappe.utils.strip_html(cstr(self.description))
+            cached = (key, text_content)
+            self._text_content_cache = cached
+        return cached[1]
+        
     def extract_metadata(self):
         """Extract and store metadata from document content and attachments"""
-        if not self.meta_data:
-            self.meta_data = {}
-            
+        self.meta_data = self._compute_metadata_dict()
+        
+    def _ensure_meta_dict(self):
+        """Parse meta_data into a dict once; it is serialized again only when written"""
+        if not isinstance(self.meta_data, dict):
+            self.meta_data = json.loads(self.meta_data) if self.meta_data else {}
+        return self.meta_data
+        
+    def _compute_metadata_dict(self):
+        """Build the metadata from document content and attachments, without changing the document"""
+        meta_data = dict(self._ensure_meta_dict())
+        
         # Extract text content for indexing
-        text_content = self.title
-        if self.description:
-            text_content += " " + frappe.utils.strip_html(cstr(self.description))
-            
-        # Store metadata
-        self.meta_data.update({
+        text_content = self.get_text_content()
+        
+        meta_data.update({
             "word_count": len(text_content.split()),
             "character_count": len(text_content),
-            "has_attachment": bool(self.attachments),
             "last_indexed": frappe.utils.now()
         })
         
-        # Extract metadata from attachments if available
-        if self.attachments:
-            self._extract_attachment_metadata()
+        # Summarize the attached files
+        meta_data.update(self._extract_attachment_metadata())
             
+        return meta_data
+        
     def _extract_attachment_metadata(self):
-        """Extract metadata from attached files"""
+        """Summarize the File records attached to the document"""
         try:
-            # This is a placeholder for attachment metadata extraction
-            # In a real implementation, this would use libraries like PyPDF, python-docx, etc.
-            attachment_metadata = {
-                "file_count": 1,  # Simplified for now
-                "file_types": ["unknown"],
-                "total_size": 0
+            files = self.get_attachments() if self.name else []
+            return {
+                "has_attachment": bool(self.attachments or files),
+                "file_count": len(files),
+                "file_types": sorted({f.file_type or "unknown" for f in files}),
+                "total_size": sum(f.file_size or 0 for f in files)
             }
-            
-            if isinstance(self.meta_data, str):
-                self.meta_data = json.loads(self.meta_data)
-                
-            self.meta_data.update(attachment_metadata)
         except Exception as e:
             frappe.log_error(f"Error extracting attachment metadata: {e}", "Document Metadata Extraction")
+            return {}
             
+    def update_attachment_metadata(self):
+        """Store the refreshed attachment summary after an attachment change, without saving the document"""
+        old_meta = self._ensure_meta_dict()
+        summary = self._extract_attachment_metadata()
+        
+        # Nothing to store unless the attachment summary changed
+        if all(old_meta.get(key) == value for key, value in summary.items()):
+            return
+            
+        new_meta = dict(old_meta, **summary)
+        self.meta_data = new_meta
+        frappe.db.set_value("Document", self.name, "meta_data", json.dumps(new_meta, default=str), update_modified=False)
+        
     def check_version_creation(self):
         """Check if a new version should be created based on changes"""
-        if not self.is_new():
-            old_doc = self.get_doc_before_save()
-            if old_doc:
-                significant_fields = ["title", "description", "document_type"]
-                for field in significant_fields:
-                    if getattr(old_doc, field) != getattr(self, field):
-                        # Will create version after save
-                        self._create_version_after_save = True
-                        return
+        # Will create version after save
+        self._create_version_after_save = not getattr(self, "_changed_fields", set()).isdisjoint(VERSIONED_FIELDS)
                         
     def on_update_after_submit(self):
         """Handle version creation after submit"""
-        if hasattr(self, '_create_version_after_save') and self._create_version_after_save:
+        if getattr(self, "_create_version_after_save", False):
             self.create_version("Auto-version after significant changes")
-            delattr(self, '_create_version_after_save')
+            self._create_version_after_save = False
             
     def create_audit_log(self, action):
-        audit_log = frappe.get_doc({
-            "doctype": "Audit Log",
+        """Queue an audit log entry; entries are written in batches by the scheduler"""
+        details = f"Document {self.name} was {action.lower()}"
+        
+        # Queued entries are inserted after this document is gone, which would
+        # fail the link validation on Audit Log.document
+        if action == "Deleted":
+            log_action(self.name, action, details)
+            return
+            
+        request = getattr(frappe.local, "request", None)
+        headers = getattr(request, "headers", None)
+        deferred_insert("Audit Log", [{
             "document": self.name,
             "action": action,
             "performed_by": frappe.session.user,
             "performed_on": frappe.utils.now(),
-            "details": f"Document {self.name} was {action.lower()}",
-            "ip_address": frappe.local.request_ip if hasattr(frappe.local, 'request_ip') else "",
-            "user_agent": frappe.local.request.headers.get('User-Agent') if hasattr(frappe.local, 'request') and hasattr(frappe.local.request, 'headers') else ""
-        })
-        audit_log.insert(ignore_permissions=True)
+            "details": details,
+            "ip_address": getattr(frappe.local, "request_ip", None) or "",
+            "user_agent": (headers.get("User-Agent") or "")[:140] if headers else ""
+        }])
         
     def get_versions(self):
         return frappe.get_all("Document Version",
             filters={"document": self.name},
-            fields=["name", "version_number", "version_notes", "created_by", "created_on", "is_current"],
+            fields=VERSION_LIST_FIELDS + ["is_current"],
             order_by="version_number desc"
         )
         
     def get_latest_version(self):
-        versions = self.get_versions()
+        versions = frappe.get_all("Document Version",
+            filters={"document": self.name},
+            fields=VERSION_LIST_FIELDS + ["is_current"],
+            order_by="version_number desc",
+            limit=1
+        )
         return versions[0] if versions else None
         
     def create_version(self, version_notes=""):
-        latest_version = self.get_latest_version()
-        version_number = (latest_version.version_number + 1) if latest_version else 1
+        latest_version_number = frappe.db.get_value("Document Version", {"document": self.name}, "MAX(version_number)")
+        version_number = (latest_version_number or 0) + 1
         
-        # Set all previous versions as not current
-        frappe.db.set_value("Document Version", {"document": self.name}, "is_current", 0)
+        # Set the current version as not current, in one statement
+        frappe.db.sql("""
+            UPDATE `tabDocument Version`
+            SET is_current = 0, modified = %s
+            WHERE document = %s AND is_current = 1
+        """, (frappe.utils.now(), self.name))
         
         # Create content snapshot
         content_snapshot = self.create_content_snapshot()
@@ -287,8 +366,6 @@ class Document(Document):
         
     def create_content_snapshot(self):
         """Create a snapshot of the document content for versioning"""
-        import json
-        
         snapshot = {
             "title": self.title,
             "content": self.content,
@@ -300,60 +377,75 @@ class Document(Document):
             "security_level": self.security_level,
             "confidentiality_flag": self.confidentiality_flag,
             "expiry_date": self.expiry_date,
-            "tags": self.tags,
-            "related_documents": self.related_documents,
+            # Plain row dicts, so the serializer never falls back to str() on child documents
+            "tags": [row.as_dict(no_default_fields=True) for row in self.tags or []],
+            "related_documents": [row.as_dict(no_default_fields=True) for row in self.related_documents or []],
             "snapshot_time": frappe.utils.now()
         }
         
-        return json.dumps(snapshot, default=str)
+        # With orjson the stored text is compact and leaves non-ASCII unescaped, so it differs
+        # from older json.dumps snapshots; Document Version compares snapshots after parsing them
+        return json_dumps(snapshot)
         
     def generate_file_hash(self):
         # This is a placeholder for file hash generation
         # In a real implementation, this would calculate a hash of the document content
         import hashlib
-        content = f"{self.title}{self.description}{self.document_type}"
-        return hashlib.md5(content.encode()).hexdigest()
+        # 16-byte BLAKE2b keeps the 32-character digest of the MD5 hashes it replaces
+        hasher = hashlib.blake2b(digest_size=16)
+        for value in (self.title, self.description, self.document_type):
+            hasher.update(cstr(value).encode())
+        return hasher.hexdigest()
         
     def update_index(self):
         """Update search index for the document"""
         try:
-            # Create or update document index record
-            index_name = f"idx-{self.name}"
-            
-            # Check if index exists
-            if frappe.db.exists("Document Index", index_name):
-                index_doc = frappe.get_doc("Document Index", index_name)
-            else:
-                index_doc = frappe.new_doc("Document Index")
-                index_doc.name = index_name
-                
-            # Update index data
-            text_content = self.title
-            if self.description:
-                text_content += " " + frappe.utils.strip_html(cstr(self.description))
-                
-            index_doc.update({
+            # Create or update the document index record in one statement
+            timestamp = frappe.utils.now()
+            frappe.db.sql("""
+                INSERT INTO `tabDocument Index`
+                    (name, creation, modified, modified_by, owner, docstatus,
+                    document, title, content, document_type, status, security_level, tags, indexed_on)
+                VALUES (%(name)s, %(timestamp)s, %(timestamp)s, %(modified_by)s, %(owner)s, 0,
+                    %(document)s, %(title)s, %(content)s, %(document_type)s, %(status)s, %(security_level)s, %(tags)s, %(timestamp)s)
+                ON DUPLICATE KEY UPDATE
+                    modified = VALUES(modified),
+                    modified_by = VALUES(modified_by),
+                    owner = VALUES(owner),
+                    document = VALUES(document),
+                    title = VALUES(title),
+                    content = VALUES(content),
+                    document_type = VALUES(document_type),
+                    status = VALUES(status),
+                    security_level = VALUES(security_level),
+                    tags = VALUES(tags),
+                    indexed_on = VALUES(indexed_on)
+            """, {
+                "name": f"idx-{self.name}",
+                "timestamp": timestamp,
+                "modified_by": frappe.session.user,
+                "owner": self.owner,
                 "document": self.name,
                 "title": self.title,
-                "content": text_content,
+                "content": self.get_text_content(),
                 "document_type": self.document_type,
                 "status": self.status,
                 "security_level": self.security_level,
-                "owner": self.owner,
-                "tags": self.tags,
-                "indexed_on": frappe.utils.now()
+                "tags": self._tags_as_text()
             })
-            
-            index_doc.save(ignore_permissions=True)
+            DocumentIndex.set_index_tags(f"idx-{self.name}", [row.tag for row in self.tags or []])
         except Exception as e:
             frappe.log_error(f"Error updating document index: {e}", "Document Indexing")
             
+    def _tags_as_text(self):
+        """Get the document's tags as the comma-separated text kept in the index"""
+        return ",".join(row.tag for row in self.tags or [] if row.get("tag"))
+        
     def remove_from_index(self):
         """Remove document from search index"""
         try:
-            index_name = f"idx-{self.name}"
-            if frappe.db.exists("Document Index", index_name):
-                frappe.delete_doc("Document Index", index_name)
+            frappe.db.delete("Document Index Tag", {"parent": f"idx-{self.name}"})
+            frappe.db.delete("Document Index", {"name": f"idx-{self.name}"})
         except Exception as e:
             frappe.log_error(f"Error removing document from index: {e}", "Document Indexing")
             
@@ -391,8 +483,7 @@ class Document(Document):
         file_doc.insert()
         
         # Update document metadata
-        self.extract_metadata()
-        self.save()
+        self.update_attachment_metadata()
         
         return file_doc.name
         
@@ -402,15 +493,14 @@ class Document(Document):
             frappe.delete_doc("File", attachment_name)
             
             # Update document metadata
-            self.extract_metadata()
-            self.save()
+            self.update_attachment_metadata()
             
             return True
         return False
         
     def validate_attachment(self, file_url, file_name=None, file_size=None):
         """Validate attachment against document type restrictions"""
-        doc_type = frappe.get_doc("Document Type", self.document_type)
+        doc_type = self._get_doc_type()
         
         if not doc_type:
             return True
@@ -423,42 +513,40 @@ class Document(Document):
                 
         # Check file type
         if doc_type.allowed_file_types and file_name:
-            allowed_types = [t.strip().lower() for t in doc_type.allowed_file_types.split(",")]
-            file_ext = file_name.split(".")[-1].lower() if "." in file_name else ""
+            allowed_types = doc_type.get_allowed_extensions()
+            file_ext = os.path.splitext(file_name)[1][1:].lower()
             
             if file_ext and file_ext not in allowed_types:
                 frappe.throw(_("File type {0} is not allowed. Allowed types: {1}").format(
-                    file_ext, ", ".join(allowed_types)
+                    file_ext, ", ".join(sorted(allowed_types))
                 ))
                 
         return True
         
     def compare_versions(self, version1_name, version2_name):
         """Compare two versions of the document"""
-        version1 = frappe.get_doc("Document Version", version1_name)
-        version2 = frappe.get_doc("Document Version", version2_name)
+        # Read just the compared columns of both versions in one query
+        versions = {
+            version.name: version
+            for version in frappe.get_all("Document Version",
+                filters={"name": ["in", [version1_name, version2_name]]},
+                fields=VERSION_LIST_FIELDS + ["file_hash"]
+            )
+        }
+        for version_name in (version1_name, version2_name):
+            if version_name not in versions:
+                frappe.throw(_("Document Version {0} not found").format(version_name), frappe.DoesNotExistError)
+                
+        version1 = versions[version1_name]
+        version2 = versions[version2_name]
         
         # Get document snapshots for each version
         # This is a simplified implementation
         # In a real system, you would store document snapshots with each version
         
         return {
-            "version1": {
-                "name": version1.name,
-                "version_number": version1.version_number,
-                "version_notes": version1.version_notes,
-                "created_by": version1.created_by,
-                "created_on": version1.created_on,
-                "file_hash": version1.file_hash
-            },
-            "version2": {
-                "name": version2.name,
-                "version_number": version2.version_number,
-                "version_notes": version2.version_notes,
-                "created_by": version2.created_by,
-                "created_on": version2.created_on,
-                "file_hash": version2.file_hash
-            },
+            "version1": version1,
+            "version2": version2,
             "differences": {
                 "content_changed": version1.file_hash != version2.file_hash,
                 "notes_different": version1.version_notes != version2.version_notes
@@ -500,7 +588,7 @@ class Document(Document):
             order_by="performed_on desc"
         )
         
-        return json.dumps(doc_data, indent=2, default=str)
+        return json_dumps(doc_data, indent=True)
         
     def _export_as_docx(self):
         """Export document as DOCX"""
@@ -534,7 +622,7 @@ class Document(Document):
             user = frappe.session.user
             
         # System managers have access to everything
-        if frappe.has_role("System Manager", user):
+        if is_system_manager(user):
             return True
             
         # Document owners have access to their own documents
@@ -545,24 +633,34 @@ class Document(Document):
         if self.security_level == "Secret":
             return False
             
-        if self.security_level == "Confidential" and not frappe.has_role("System Manager", user):
+        if self.security_level == "Confidential" and not is_system_manager(user):
             return False
             
         # Check for temporary access grants
-        active_grants = frappe.get_all("Document Access Grant",
-            filters={
-                "document": self.name,
-                "user": user,
-                "expires_on": [">=", frappe.utils.now()]
-            }
-        )
-        
-        if active_grants:
+        if self.name in DocumentAccessGrant.get_cached_grants(user):
             return True
             
         # Default access check
         return frappe.has_permission("Document", "read", user=user)
 
+def send_status_notifications_job(document_name, old_status, new_status):
+    """Send the notifications for a document status change (background job)"""
+    frappe.get_doc("Document", document_name).send_status_notifications(old_status, new_status)
+
+def on_doctype_update():
+    # Document lists page by (modified, name)
+    frappe.db.add_index("Document", ["modified", "name"])
+    
+    # Filtered lists read the newest matches straight off these indexes, without a filesort
+    frappe.db.add_index("Document", ["document_type", "status", "modified"])
+    frappe.db.add_index("Document", ["owner", "modified"])
+    frappe.db.add_index("Document", ["security_level", "modified"])
+    frappe.db.add_index("Document", ["expiry_date"])
+    
+    # The other list orders api.document.list_documents accepts
+    frappe.db.add_index("Document", ["document_date", "name"])
+    frappe.db.add_index("Document", ["title", "name"])
+
 # Whitelisted methods for client-side calls
 @frappe.whitelist()
 def create_version(docname, version_notes=""):
@@ -2,134 +2,233 @@
 # For license information, please see license.txt
 
 import frappe
+import hashlib
+import json
+import re
+from functools import lru_cache
 from frappe import _
-from frappe.utils import getdate, nowdate
+from frappe.utils import cint, getdate, nowdate
 from frappe.model.document import Document
+from pwp_project.pwp_project.doctype.document_access_grant.document_access_grant import DocumentAccessGrant
+from pwp_project.pwp_project.utils import FULLTEXT_MIN_WORD_LENGTH, is_system_manager, like_pattern
+
+# get_documents counts are cached per query for a short while
+DOCUMENT_COUNT_CACHE_PREFIX = "document_count:"
+DOCUMENT_COUNT_CACHE_TTL = 30
+
+# Bumped whenever a document changes; cached counts and statistics are keyed by it, so bumping
+# it invalidates them in O(1) and the stale keys simply expire
+DOCUMENT_COUNTS_GENERATION_KEY = "document_counts:gen"
+
+# get_document_statistics results are cached per user for a short while
+DOCUMENT_STATISTICS_CACHE_PREFIX = "document_statistics:"
+DOCUMENT_STATISTICS_CACHE_TTL = 60
+
+# get_document_filters options, cached per language until a Document Type or User changes
+DOCUMENT_FILTERS_CACHE_PREFIX = "document_filters:v1:"
+DOCUMENT_FILTERS_CACHE_TTL = 300
+
+# get_documents filters and the condition each adds, in the order they appear in the query
+DOCUMENT_FILTER_CONDITIONS = {
+    'title': "doc.title LIKE %(title)s",
+    'document_type': "doc.document_type = %(document_type)s",
+    'status': "doc.status = %(status)s",
+    'security_level': "doc.security_level = %(security_level)s",
+    'owner': "doc.owner = %(owner)s",
+    'from_date': "doc.document_date >= %(from_date)s",
+    'to_date': "doc.document_date <= %(to_date)s",
+    'expiry_before': "doc.expiry_date <= %(expiry_before)s",
+    'expiry_after': "doc.expiry_date >= %(expiry_after)s",
+    'tags': "doc.tags LIKE %(tags)s",
+    'content': "(doc.content LIKE %(content)s OR doc.description LIKE %(content)s)",
+    'confidentiality_flag': "doc.confidentiality_flag = %(confidentiality_flag)s"
+}
+LIKE_DOCUMENT_FILTERS = frozenset(('title', 'tags', 'content'))
+
+# Users with more active grants than this are filtered with a join instead of an IN list
+MAX_GRANTED_DOCUMENTS_IN_LIST = 1000
 
 @frappe.whitelist()
-def get_documents(filters=None, order_by="modified desc", limit_start=0, limit_page_length=20):
+def get_documents(filters=None, cursor=None, limit_page_length=20, include_count=False, include_type_name=True):
     """
-    Get documents with optional filtering and pagination
+    Get documents with optional filtering and keyset pagination
     
     Args:
         filters (dict): Dictionary of filters to apply
-        order_by (str): Order by clause
-        limit_start (int): Start offset for pagination
+        cursor (dict): The next_cursor of the previous page; omit for the first page
         limit_page_length (int): Number of records to return
+        include_count (bool): Also count all matching documents; always done on the first page
+        include_type_name (bool): Join the document type to return its document_type_name
         
     Returns:
-        list: List of documents matching the criteria
+        dict: The documents, the cursor of the next page (None on the last page) and the count
     """
-    # Build query conditions
-    conditions = []
-    values = {}
+    filters = frappe.parse_json(filters) if filters else None
+    cursor = frappe.parse_json(cursor) if cursor else None
+    limit_page_length = cint(limit_page_length) or 20
     
-    if filters:
-        # Title filter
-        if filters.get('title'):
-            conditions.append("doc.title LIKE %(title)s")
-            values['title'] = f"%{filters['title']}%"
-            
-        # Document type filter
-        if filters.get('document_type'):
-            conditions.append("doc.document_type = %(document_type)s")
-            values['document_type'] = filters['document_type']
-            
-        # Status filter
-        if filters.get('status'):
-            conditions.append("doc.status = %(status)s")
-            values['status'] = filters['status']
-            
-        # Security level filter
-        if filters.get('security_level'):
-            conditions.append("doc.security_level = %(security_level)s")
-            values['security_level'] = filters['security_level']
-            
-        # Owner filter
-        if filters.get('owner'):
-            conditions.append("doc.owner = %(owner)s")
-            values['owner'] = filters['owner']
-            
-        # Date range filter
-        if filters.get('from_date'):
-            conditions.append("doc.document_date >= %(from_date)s")
-            values['from_date'] = filters['from_date']
-            
-        if filters.get('to_date'):
-            conditions.append("doc.document_date <= %(to_date)s")
-            values['to_date'] = filters['to_date']
-            
-        # Expiry date filter
-        if filters.get('expiry_before'):
-            conditions.append("doc.expiry_date <= %(expiry_before)s")
-            values['expiry_before'] = filters['expiry_before']
-            
-        if filters.get('expiry_after'):
-            conditions.append("doc.expiry_date >= %(expiry_after)s")
-            values['expiry_after'] = filters['expiry_after']
-            
-        # Tags filter
-        if filters.get('tags'):
-            conditions.append("doc.tags LIKE %(tags)s")
-            values['tags'] = f"%{filters['tags']}%"
-            
-        # Content filter
-        if filters.get('content'):
-            conditions.append("(doc.content LIKE %(content)s OR doc.description LIKE %(content)s)")
-            values['content'] = f"%{filters['content']}%"
-            
-        # Confidentiality flag filter
-        if filters.get('confidentiality_flag') is not None:
-            conditions.append("doc.confidentiality_flag = %(confidentiality_flag)s")
-            values['confidentiality_flag'] = filters['confidentiality_flag']
+    # Only the filter values change between calls; the SQL text depends on which are set
+    values = {}
+    filter_keys = []
+    for key in DOCUMENT_FILTER_CONDITIONS:
+        value = filters.get(key) if filters else None
+        if value is None or (not value and key != 'confidentiality_flag'):
+            continue
+        filter_keys.append(key)
+        values[key] = like_pattern(value) if key in LIKE_DOCUMENT_FILTERS else value
     
     # Apply security filtering based on user permissions
-    user = frappe.session.user
-    if not frappe.has_role("System Manager", user):
-        # Non-system managers can only see documents they own or have access to
+    acl_join, acl_condition = _build_acl_clause(values)
+    query, count_query = _build_documents_query(tuple(filter_keys), acl_join, acl_condition, bool(cursor),
+        bool(cint(include_type_name)))
+    
+    # Count before the cursor values are added, so the count covers every page
+    count = None
+    if include_count or not cursor:
+        count = _count_documents(count_query, values)
+    
+    # Continue after the last row of the previous page, in (modified, name) order
+    if cursor:
+        values['cursor_modified'] = cursor.get('modified')
+        values['cursor_name'] = cursor.get('name')
+    
+    # Fetch one extra row to learn whether there is a next page
+    values['limit_page_length'] = limit_page_length + 1
+    
+    # Execute query
+    documents = frappe.db.sql(query, values, as_dict=True)
+    
+    has_more = len(documents) > limit_page_length
+    documents = documents[:limit_page_length]
+    
+    next_cursor = None
+    if has_more:
+        next_cursor = {'modified': documents[-1].modified, 'name': documents[-1].name}
+    
+    return {
+        'documents': documents,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'count': count
+    }
+
+@lru_cache(maxsize=256)
+def _build_documents_query(filter_keys, acl_join, acl_condition, paged, include_type_name):
+    """
+    Assemble the get_documents query and its count query for one query shape,
+    so repeated requests with the same filters reuse the same SQL text
+    
+    Returns:
+        tuple: (query, count_query)
+    """
+    conditions = [DOCUMENT_FILTER_CONDITIONS[key] for key in filter_keys]
+    if acl_condition:
+        conditions.append(acl_condition)
+        
+    count_query = "SELECT COUNT(*) as count FROM `tabDocument` doc " + acl_join
+    if conditions:
+        count_query += " WHERE " + " AND ".join(conditions)
+        
+    if paged:
         conditions.append("""
-            (doc.owner = %(user)s 
-            OR doc.security_level IN ('Public', 'Internal')
-            OR EXISTS (
-                SELECT 1 FROM `tabDocument Access Grant` dag 
-                WHERE dag.document = doc.name 
-                AND dag.user = %(user)s 
-                AND dag.expires_on >= %(now)s
-            ))
+            (doc.modified < %(cursor_modified)s
+            OR (doc.modified = %(cursor_modified)s AND doc.name < %(cursor_name)s))
         """)
-        values['user'] = user
-        values['now'] = nowdate()
-    
-    # Build the query
+        
+    type_name, type_join = _document_type_name_sql(include_type_name)
     query = """
         SELECT 
             doc.name, doc.title, doc.document_type, doc.document_number, 
             doc.document_date, doc.status, doc.security_level, doc.owner,
             doc.creation_date, doc.last_modified, doc.confidentiality_flag,
-            doc.expiry_date, dt.document_type_name
+            doc.expiry_date, doc.modified{type_name}
         FROM `tabDocument` doc
-        LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
-    """
+        {type_join}
+    """.format(type_name=type_name, type_join=type_join) + acl_join
     
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
         
-    query += f" ORDER BY {order_by} LIMIT {limit_start}, {limit_page_length}"
+    query += " ORDER BY doc.modified DESC, doc.name DESC LIMIT %(limit_page_length)s"
     
-    # Execute query
-    documents = frappe.db.sql(query, values, as_dict=True)
+    return query, count_query
+
+def _count_documents(count_query, values):
+    """
+    Count the documents matching a get_documents query, reusing a count made
+    for the same query in the last DOCUMENT_COUNT_CACHE_TTL seconds
+    """
+    query_hash = hashlib.blake2b(
+        json.dumps([count_query, values], sort_keys=True, default=str).encode(), digest_size=16
+    ).hexdigest()
+    cache_key = f"{DOCUMENT_COUNT_CACHE_PREFIX}{_document_counts_generation()}:{query_hash}"
+    
+    count = frappe.cache().get_value(cache_key)
+    if count is None:
+        count = frappe.db.sql(count_query, values, as_dict=True)[0].count
+        frappe.cache().set_value(cache_key, count, expires_in_sec=DOCUMENT_COUNT_CACHE_TTL)
+        
+    return count
+
+def _document_type_name_sql(include_type_name):
+    """
+    Get the select column and join that add dt.document_type_name to a document
+    query, or nothing when the caller does not show the type name
     
-    # Get count for pagination
-    count_query = "SELECT COUNT(*) as count FROM `tabDocument` doc"
-    if conditions:
-        count_query += " WHERE " + " AND ".join(conditions)
+    Returns:
+        tuple: (column_sql, join_sql)
+    """
+    if not include_type_name:
+        return "", ""
+    return ", dt.document_type_name", "LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name"
+
+def _document_counts_generation():
+    """Get the current generation of the cached document counts"""
+    cache = frappe.cache()
+    return cint(cache.get(cache.make_key(DOCUMENT_COUNTS_GENERATION_KEY)))
+
+def clear_document_count_cache():
+    """Drop the cached document counts and statistics (called when a document is saved or deleted)"""
+    # Moving to a new generation orphans every cached count and statistic without scanning the keyspace
+    cache = frappe.cache()
+    cache.incr(cache.make_key(DOCUMENT_COUNTS_GENERATION_KEY))
+
+def _build_acl_clause(values):
+    """
+    Build the join and condition that limit a document query to what the
+    session user may see, adding their parameters to `values`
+    
+    Returns:
+        tuple: (join_sql, condition_sql), both empty for System Managers
+    """
+    user = frappe.session.user
+    if is_system_manager(user):
+        return "", ""
         
-    count = frappe.db.sql(count_query, values, as_dict=True)[0].count
+    values['user'] = user
+    visible = """
+        (doc.owner = %(user)s 
+        OR doc.security_level IN ('Public', 'Internal'){granted})
+    """
     
-    return {
-        'documents': documents,
-        'count': count
-    }
+    granted_documents = DocumentAccessGrant.get_cached_grants(user)
+    if not granted_documents:
+        return "", visible.format(granted="")
+        
+    if len(granted_documents) <= MAX_GRANTED_DOCUMENTS_IN_LIST:
+        values['granted_documents'] = tuple(granted_documents)
+        return "", visible.format(granted="\n        OR doc.name IN %(granted_documents)s")
+        
+    # Too many grants for an IN list: read them once and join, rather than
+    # probing with a correlated subquery for every document row
+    values['now'] = nowdate()
+    join_sql = """
+        LEFT JOIN (
+            SELECT DISTINCT document FROM `tabDocument Access Grant`
+            WHERE user = %(user)s AND expires_on >= %(now)s
+        ) dag ON dag.document = doc.name
+    """
+    return join_sql, visible.format(granted="\n        OR dag.document IS NOT NULL")
 
 @frappe.whitelist()
 def get_document_filters():
@@ -139,6 +238,11 @@ def get_document_filters():
     Returns:
         dict: Dictionary of available filter options
     """
+    cache_key = DOCUMENT_FILTERS_CACHE_PREFIX + (frappe.local.lang or "en")
+    cached = frappe.cache().get_value(cache_key)
+    if cached is not None:
+        return cached
+        
     # Get document types
     document_types = frappe.get_all("Document Type", 
         filters={"is_active": 1},
@@ -170,21 +274,29 @@ def get_document_filters():
         order_by="full_name"
     )
     
-    return {
+    document_filters = {
         "document_types": document_types,
         "statuses": statuses,
         "security_levels": security_levels,
         "users": users
     }
+    frappe.cache().set_value(cache_key, document_filters, expires_in_sec=DOCUMENT_FILTERS_CACHE_TTL)
+    
+    return document_filters
+
+def clear_document_filters_cache(doc=None, method=None):
+    """Drop the cached filter options (called when a Document Type or User changes)"""
+    frappe.cache().delete_keys(DOCUMENT_FILTERS_CACHE_PREFIX)
 
 @frappe.whitelist()
-def search_documents(search_text, limit=20):
+def search_documents(search_text, limit=20, include_type_name=False):
     """
     Search documents by text in title, content, or tags
     
     Args:
         search_text (str): Text to search for
         limit (int): Maximum number of results to return
+        include_type_name (bool): Join the document type to return its document_type_name
         
     Returns:
         list: List of matching documents
@@ -194,50 +306,62 @@ def search_documents(search_text, limit=20):
     
     # Build search conditions
     conditions = []
-    values = {"search_text": f"%{search_text}%", "limit": limit}
-    
-    # Search in title, content, description, and tags
-    conditions.append("""
-        (doc.title LIKE %(search_text)s 
-        OR doc.content LIKE %(search_text)s 
-        OR doc.description LIKE %(search_text)s 
-        OR doc.tags LIKE %(search_text)s)
-    """)
-    
-    # Apply security filtering
-    user = frappe.session.user
-    if not frappe.has_role("System Manager", user):
+    values = {"limit": limit}
+    words = re.findall(r"\w+", search_text)
+    
+    # Words shorter than the FULLTEXT minimum token size are not indexed,
+    # so those searches fall back to a LIKE scan
+    use_fulltext = bool(words) and min(len(word) for word in words) >= FULLTEXT_MIN_WORD_LENGTH
+    
+    if use_fulltext:
+        # Require every word, matching it as a prefix
+        values["search_terms"] = " ".join(f"+{word}*" for word in words)
+        match = "MATCH(doc.title, doc.content, doc.description) AGAINST (%(search_terms)s IN BOOLEAN MODE)"
+        conditions.append(match)
+        score = f", {match} AS score"
+        order_by = "score DESC, doc.modified DESC"
+    else:
+        values["search_text"] = like_pattern(search_text)
         conditions.append("""
-            (doc.owner = %(user)s 
-            OR doc.security_level IN ('Public', 'Internal')
-            OR EXISTS (
-                SELECT 1 FROM `tabDocument Access Grant` dag 
-                WHERE dag.document = doc.name 
-                AND dag.user = %(user)s 
-                AND dag.expires_on >= %(now)s
-            ))
+            (doc.title LIKE %(search_text)s 
+            OR doc.content LIKE %(search_text)s 
+            OR doc.description LIKE %(search_text)s)
         """)
-        values['user'] = user
-        values['now'] = nowdate()
+        # Rank title matches first, then content, then description-only matches
+        score = """,
+            CASE
+                WHEN doc.title LIKE %(search_text)s THEN 2
+                WHEN doc.content LIKE %(search_text)s THEN 1
+                ELSE 0
+            END AS score"""
+        order_by = "score DESC, doc.modified DESC"
+    
+    # Apply security filtering based on user permissions
+    acl_join, acl_condition = _build_acl_clause(values)
+    if acl_condition:
+        conditions.append(acl_condition)
     
     # Build query
+    type_name, type_join = _document_type_name_sql(cint(include_type_name))
     query = """
         SELECT 
             doc.name, doc.title, doc.document_type, doc.document_number, 
             doc.document_date, doc.status, doc.security_level, doc.owner,
-            doc.creation_date, dt.document_type_name
+            doc.creation_date{type_name}{score}
         FROM `tabDocument` doc
-        LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
+        {type_join}
+        {acl_join}
         WHERE {conditions}
-        ORDER BY 
-            CASE 
-                WHEN doc.title LIKE %(search_text)s THEN 1
-                WHEN doc.content LIKE %(search_text)s THEN 2
-                ELSE 3
-            END,
-            doc.modified DESC
+        ORDER BY {order_by}
         LIMIT %(limit)s
-    """.format(conditions=" AND ".join(conditions))
+    """.format(
+        type_name=type_name,
+        type_join=type_join,
+        score=score,
+        acl_join=acl_join,
+        conditions=" AND ".join(conditions),
+        order_by=order_by
+    )
     
     # Execute query
     documents = frappe.db.sql(query, values, as_dict=True)
@@ -245,7 +369,7 @@ def search_documents(search_text, limit=20):
     return documents
 
 @frappe.whitelist()
-def get_documents_by_type(document_type, status=None, limit=20):
+def get_documents_by_type(document_type, status=None, limit=20, include_type_name=True):
     """
     Get documents by document type with optional status filter
     
@@ -253,6 +377,7 @@ def get_documents_by_type(document_type, status=None, limit=20):
         document_type (str): Document type name
         status (str): Optional status filter
         limit (int): Maximum number of results to return
+        include_type_name (bool): Join the document type to return its document_type_name
         
     Returns:
         list: List of matching documents
@@ -264,34 +389,25 @@ def get_documents_by_type(document_type, status=None, limit=20):
         conditions.append("doc.status = %(status)s")
         values['status'] = status
     
-    # Apply security filtering
-    user = frappe.session.user
-    if not frappe.has_role("System Manager", user):
-        conditions.append("""
-            (doc.owner = %(user)s 
-            OR doc.security_level IN ('Public', 'Internal')
-            OR EXISTS (
-                SELECT 1 FROM `tabDocument Access Grant` dag 
-                WHERE dag.document = doc.name 
-                AND dag.user = %(user)s 
-                AND dag.expires_on >= %(now)s
-            ))
-        """)
-        values['user'] = user
-        values['now'] = nowdate()
+    # Apply security filtering based on user permissions
+    acl_join, acl_condition = _build_acl_clause(values)
+    if acl_condition:
+        conditions.append(acl_condition)
     
     # Build query
+    type_name, type_join = _document_type_name_sql(cint(include_type_name))
     query = """
         SELECT 
             doc.name, doc.title, doc.document_type, doc.document_number, 
             doc.document_date, doc.status, doc.security_level, doc.owner,
-            doc.creation_date, dt.document_type_name
+            doc.creation_date{type_name}
         FROM `tabDocument` doc
-        LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
+        {type_join}
+        {acl_join}
         WHERE {conditions}
         ORDER BY doc.modified DESC
         LIMIT %(limit)s
-    """.format(conditions=" AND ".join(conditions))
+    """.format(type_name=type_name, type_join=type_join, acl_join=acl_join, conditions=" AND ".join(conditions))
     
     # Execute query
     documents = frappe.db.sql(query, values, as_dict=True)
@@ -299,44 +415,45 @@ def get_documents_by_type(document_type, status=None, limit=20):
     return documents
 
 @frappe.whitelist()
-def get_expired_documents():
+def get_expired_documents(within_days=30, limit=100, start=0, include_type_name=True):
     """
     Get documents that have expired or will expire soon
     
+    Args:
+        within_days (int): Only include documents that expired in the last this many days; 0 for all
+        limit (int): Maximum number of results to return
+        start (int): Number of results to skip, for paging
+        include_type_name (bool): Join the document type to return its document_type_name
+        
     Returns:
         list: List of expired or soon-to-expire documents
     """
     conditions = ["doc.expiry_date <= %(warning_date)s"]
-    values = {"warning_date": getdate()}
+    values = {"warning_date": getdate(), "limit": cint(limit) or 100, "start": cint(start)}
     
-    # Apply security filtering
-    user = frappe.session.user
-    if not frappe.has_role("System Manager", user):
-        conditions.append("""
-            (doc.owner = %(user)s 
-            OR doc.security_level IN ('Public', 'Internal')
-            OR EXISTS (
-                SELECT 1 FROM `tabDocument Access Grant` dag 
-                WHERE dag.document = doc.name 
-                AND dag.user = %(user)s 
-                AND dag.expires_on >= %(now)s
-            ))
-        """)
-        values['user'] = user
-        values['now'] = nowdate()
+    if cint(within_days):
+        conditions.append("doc.expiry_date >= DATE_SUB(%(warning_date)s, INTERVAL %(within_days)s DAY)")
+        values['within_days'] = cint(within_days)
+    
+    # Apply security filtering based on user permissions
+    acl_join, acl_condition = _build_acl_clause(values)
+    if acl_condition:
+        conditions.append(acl_condition)
     
     # Build query
+    type_name, type_join = _document_type_name_sql(cint(include_type_name))
     query = """
         SELECT 
             doc.name, doc.title, doc.document_type, doc.document_number, 
-            doc.document_date, doc.status, doc.security_level, doc.owner,
-            doc.expiry_date, dt.document_type_name,
+            doc.status, doc.security_level, doc.expiry_date{type_name},
             DATEDIFF(doc.expiry_date, %(warning_date)s) as days_until_expiry
         FROM `tabDocument` doc
-        LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
+        {type_join}
+        {acl_join}
         WHERE {conditions}
-        ORDER BY doc.expiry_date ASC
-    """.format(conditions=" AND ".join(conditions))
+        ORDER BY doc.expiry_date ASC, doc.name ASC
+        LIMIT %(start)s, %(limit)s
+    """.format(type_name=type_name, type_join=type_join, acl_join=acl_join, conditions=" AND ".join(conditions))
     
     # Execute query
     documents = frappe.db.sql(query, values, as_dict=True)
@@ -351,73 +468,58 @@ def get_document_statistics():
     Returns:
         dict: Dictionary of document statistics
     """
+    cache_key = f"{DOCUMENT_STATISTICS_CACHE_PREFIX}{_document_counts_generation()}:{frappe.session.user}"
+    statistics = frappe.cache().get_value(cache_key)
+    if statistics is not None:
+        return statistics
+        
     # Apply security filtering
-    user = frappe.session.user
-    security_condition = ""
-    values = {}
-    
-    if not frappe.has_role("System Manager", user):
-        security_condition = """
-            WHERE (doc.owner = %(user)s 
-            OR doc.security_level IN ('Public', 'Internal')
-            OR EXISTS (
-                SELECT 1 FROM `tabDocument Access Grant` dag 
-                WHERE dag.document = doc.name 
-                AND dag.user = %(user)s 
-                AND dag.expires_on >= %(now)s
-            ))
-        """
-        values['user'] = user
-        values['now'] = nowdate()
-    
-    # Get total documents
-    total_query = "SELECT COUNT(*) as count FROM `tabDocument` doc " + security_condition
-    total_count = frappe.db.sql(total_query, values, as_dict=True)[0].count
-    
-    # Get documents by status
-    status_query = """
-        SELECT doc.status, COUNT(*) as count 
-        FROM `tabDocument` doc 
-        {security_condition}
-        GROUP BY doc.status
-    """.format(security_condition=security_condition)
-    status_counts = frappe.db.sql(status_query, values, as_dict=True)
-    
-    # Get documents by security level
-    security_query = """
-        SELECT doc.security_level, COUNT(*) as count 
-        FROM `tabDocument` doc 
-        {security_condition}
-        GROUP BY doc.security_level
-    """.format(security_condition=security_condition)
-    security_counts = frappe.db.sql(security_query, values, as_dict=True)
-    
-    # Get documents by type
-    type_query = """
-        SELECT dt.document_type_name, COUNT(doc.name) as count 
-        FROM `tabDocument` doc
-        LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
-        {security_condition}
-        GROUP BY dt.document_type_name
-        ORDER BY count DESC
-        LIMIT 10
-    """.format(security_condition=security_condition)
-    type_counts = frappe.db.sql(type_query, values, as_dict=True)
-    
-    # Get expired documents count
-    expired_query = """
-        SELECT COUNT(*) as count 
-        FROM `tabDocument` doc 
-        {security_condition}
-        AND doc.expiry_date < %(now)s
-    """.format(security_condition=security_condition)
-    values['now'] = nowdate()
-    expired_count = frappe.db.sql(expired_query, values, as_dict=True)[0].count
+    values = {'today': nowdate()}
+    acl_join, acl_condition = _build_acl_clause(values)
+    security_condition = f"WHERE {acl_condition}" if acl_condition else ""
+    
+    # Read the visible documents once and aggregate them every way in the same statement
+    rows = frappe.db.sql("""
+        WITH filtered AS (
+            SELECT doc.status, doc.security_level, doc.expiry_date, dt.document_type_name
+            FROM `tabDocument` doc
+            LEFT JOIN `tabDocument Type` dt ON doc.document_type = dt.name
+            {acl_join}
+            {security_condition}
+        )
+        SELECT 'total' AS stat, NULL AS value, COUNT(*) AS count FROM filtered
+        UNION ALL
+        SELECT 'expired', NULL, COUNT(*) FROM filtered WHERE expiry_date < %(today)s
+        UNION ALL
+        SELECT 'status', status, COUNT(*) FROM filtered GROUP BY status
+        UNION ALL
+        SELECT 'security_level', security_level, COUNT(*) FROM filtered GROUP BY security_level
+        UNION ALL
+        SELECT 'document_type_name', document_type_name, COUNT(*) FROM filtered GROUP BY document_type_name
+    """.format(acl_join=acl_join, security_condition=security_condition), values, as_dict=True)
+    
+    statistics = {
+        "total_documents": 0,
+        "status_counts": [],
+        "security_counts": [],
+        "type_counts": [],
+        "expired_count": 0
+    }
+    grouped = {
+        "status": statistics["status_counts"],
+        "security_level": statistics["security_counts"],
+        "document_type_name": statistics["type_counts"]
+    }
+    for row in rows:
+        if row.stat == "total":
+            statistics["total_documents"] = row.count
+        elif row.stat == "expired":
+            statistics["expired_count"] = row.count
+        else:
+            grouped[row.stat].append(frappe._dict({row.stat: row.value, "count": row.count}))
+            
+    # Only the ten most common document types are shown
+    statistics["type_counts"] = sorted(statistics["type_counts"], key=lambda row: row["count"], reverse=True)[:10]
     
-    return {
-        "total_documents": total_count,
-        "status_counts": status_counts,
-        "security_counts": security_counts,
-        "type_counts": type_counts,
-        "expired_count": expired_count
-    }
\ No newline at end of file
+    frappe.cache().set_value(cache_key, statistics, expires_in_sec=DOCUMENT_STATISTICS_CACHE_TTL)
+    return statistics
@@ -0,0 +1,68 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+import json
+import unittest
+
+class TestDocument(unittest.TestCase):
+    def setUp(self):
+        # Create a test document type
+        if not frappe.db.exists("Document Type", "Attachment Test Type"):
+            frappe.get_doc({
+                "doctype": "Document Type",
+                "name": "Attachment Test Type",
+                "document_type_name": "Attachment Test Type",
+                "description": "Document type for attachment testing",
+                "security_level": "Internal"
+            }).insert()
+
+        # Create a test document
+        self.doc = frappe.get_doc({
+            "doctype": "Document",
+            "title": "Attachment Test Document",
+            "document_number": "ATTACHMENT-TEST-001",
+            "document_type": "Attachment Test Type",
+            "security_level": "Internal",
+            "status": "Draft"
+        })
+        self.doc.insert()
+
+    def tearDown(self):
+        # Clean up test data
+        for attachment in frappe.get_all("File", {"attached_to_doctype": "Document", "attached_to_name": self.doc.name}):
+            frappe.delete_doc("File", attachment.name)
+
+        if frappe.db.exists("Document", self.doc.name):
+            frappe.delete_doc("Document", self.doc.name)
+
+        if frappe.db.exists("Document Type", "Attachment Test Type"):
+            frappe.delete_doc("Document Type", "Attachment Test Type")
+
+    def get_stored_meta_data(self):
+        return json.loads(frappe.db.get_value("Document", self.doc.name, "meta_data") or "{}")
+
+    def test_add_attachment_updates_meta_data(self):
+        """Test that adding an attachment stores the new attachment summary"""
+        before = self.get_stored_meta_data()
+        self.assertEqual(before.get("file_count"), 0)
+        self.assertFalse(before.get("has_attachment"))
+
+        self.doc.add_attachment("https://example.com/files/report.pdf", file_size=2048)
+
+        after = self.get_stored_meta_data()
+        self.assertNotEqual(after, before)
+        self.assertEqual(after["file_count"], 1)
+        self.assertTrue(after["has_attachment"])
+        self.assertEqual(after["total_size"], 2048)
+
+    def test_remove_attachment_updates_meta_data(self):
+        """Test that removing the last attachment clears the attachment summary"""
+        attachment = self.doc.add_attachment("https://example.com/files/report.pdf")
+        self.assertEqual(self.get_stored_meta_data()["file_count"], 1)
+
+        self.assertTrue(self.doc.remove_attachment(attachment))
+
+        after = self.get_stored_meta_data()
+        self.assertEqual(after["file_count"], 0)
+        self.assertFalse(after["has_attachment"])
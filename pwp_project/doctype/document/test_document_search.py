@@ -0,0 +1,91 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+import unittest
+from pwp_project.pwp_project.doctype.document.document_search import get_documents
+
+class TestDocumentSearch(unittest.TestCase):
+    def setUp(self):
+        # Create a document type that only these tests use, so filtering on it isolates their rows
+        if not frappe.db.exists("Document Type", "Cursor Test Type"):
+            frappe.get_doc({
+                "doctype": "Document Type",
+                "name": "Cursor Test Type",
+                "document_type_name": "Cursor Test Type",
+                "description": "Document type for keyset pagination testing",
+                "security_level": "Internal"
+            }).insert()
+
+        # Create documents that all share the same modified timestamp
+        self.documents = []
+        for index in range(4):
+            doc = frappe.get_doc({
+                "doctype": "Document",
+                "title": f"Cursor Test Document {index}",
+                "document_number": f"CURSOR-TEST-{index}",
+                "document_type": "Cursor Test Type",
+                "security_level": "Internal",
+                "status": "Draft"
+            })
+            doc.insert()
+            self.documents.append(doc.name)
+
+        frappe.db.sql("""
+            UPDATE `tabDocument` SET modified = '2025-01-01 10:00:00'
+            WHERE name IN %(names)s
+        """, {"names": tuple(self.documents)})
+
+    def tearDown(self):
+        # Clean up test data
+        for name in self.documents:
+            if frappe.db.exists("Document", name):
+                frappe.delete_doc("Document", name)
+
+        if frappe.db.exists("Document Type", "Cursor Test Type"):
+            frappe.delete_doc("Document Type", "Cursor Test Type")
+
+    def get_page(self, cursor=None, limit_page_length=2):
+        # Round-trip the cursor through JSON as a client would
+        return get_documents(
+            filters={"document_type": "Cursor Test Type"},
+            cursor=frappe.as_json(cursor) if cursor else None,
+            limit_page_length=limit_page_length
+        )
+
+    def test_cursor_breaks_modified_ties_on_name(self):
+        """Test walking two pages of documents that share the same modified timestamp"""
+        expected = sorted(self.documents, reverse=True)
+
+        first_page = self.get_page()
+        self.assertEqual([doc.name for doc in first_page['documents']], expected[:2])
+        self.assertTrue(first_page['has_more'])
+        self.assertEqual(first_page['next_cursor']['name'], expected[1])
+
+        second_page = self.get_page(first_page['next_cursor'])
+        self.assertEqual([doc.name for doc in second_page['documents']], expected[2:])
+
+        # The second page is the last one, even though it is full
+        self.assertFalse(second_page['has_more'])
+        self.assertIsNone(second_page['next_cursor'])
+
+    def test_last_page_without_cursor(self):
+        """Test that a single page holding every document has no next cursor"""
+        page = self.get_page(limit_page_length=10)
+
+        self.assertEqual(len(page['documents']), 4)
+        self.assertFalse(page['has_more'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_partial_last_page(self):
+        """Test that a short last page reports no further pages"""
+        first_page = self.get_page(limit_page_length=3)
+        second_page = self.get_page(first_page['next_cursor'], limit_page_length=3)
+
+        self.assertEqual(len(second_page['documents']), 1)
+        self.assertFalse(second_page['has_more'])
+        self.assertIsNone(second_page['next_cursor'])
+
+        # Together the pages hold every document exactly once
+        names = [doc.name for doc in first_page['documents'] + second_page['documents']]
+        self.assertEqual(sorted(names), sorted(self.documents))
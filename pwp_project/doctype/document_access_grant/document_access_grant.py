@@ -3,18 +3,35 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import now, add_days
+from frappe.utils import now, add_days, now_datetime
 from frappe import _
+from pwp_project.pwp_project.doctype.audit_log.audit_log import log_action
+from pwp_project.pwp_project.doctype.notification_log.notification_log import NotificationLog
+from pwp_project.pwp_project.utils import is_system_manager
+
+# Documents each user has an active grant to, cached for at most a minute
+ACTIVE_GRANTS_CACHE_KEY = "document_access_grants:{0}"
+ACTIVE_GRANTS_CACHE_TTL = 60
 
 class DocumentAccessGrant(Document):
     def validate(self):
         self.validate_expiry()
         self.validate_permissions()
-        self.set_active_status()
         
     def before_save(self):
         self.notify_user()
         
+    def on_update(self):
+        clear_active_grants_cache(self.user)
+        
+        # A grant moved to another user must also drop out of the previous user's cache
+        doc_before_save = self.get_doc_before_save()
+        if doc_before_save and doc_before_save.user != self.user:
+            clear_active_grants_cache(doc_before_save.user)
+        
+    def on_trash(self):
+        clear_active_grants_cache(self.user)
+        
     def validate_expiry(self):
         """Validate that expiry date is in the future"""
         if self.expires_on and self.expires_on < now():
@@ -22,7 +39,7 @@ class DocumentAccessGrant(Document):
             
     def validate_permissions(self):
         """Validate that the user granting access has permission to do so"""
-        if self.granted_by != frappe.session.user and not frappe.has_role("System Manager"):
+        if self.granted_by != frappe.session.user and not is_system_manager():
             frappe.throw(_("You can only create access grants for yourself"))
             
         # Check if user has permission to the document
@@ -30,94 +47,81 @@ class DocumentAccessGrant(Document):
         if not doc.check_access_permission(self.granted_by):
             frappe.throw(_("You do not have permission to grant access to this document"))
             
-    def set_active_status(self):
-        """Set active status based on expiry date"""
-        if self.expires_on and self.expires_on < now():
-            self.is_active = 0
-        else:
-            self.is_active = 1
-            
     def notify_user(self):
-        """Notify the user about the access grant"""
+        """Notify the user about the access grant, in the background once the grant is saved"""
         if self.is_new():
-            # Get document details
-            doc = frappe.get_doc("Document", self.document)
-            
-            # Create notification
-            notification = frappe.get_doc({
-                "doctype": "Notification Log",
-                "subject": _("Access Granted to Document: {0}").format(doc.title),
-                "for_user": self.user,
-                "type": "Alert",
-                "document_type": "Document",
-                "document_name": self.document,
-                "email_content": _("""
-                    <p>You have been granted temporary access to a document:</p>
-                    <p><strong>Title:</strong> {0}</p>
-                    <p><strong>Type:</strong> {1}</p>
-                    <p><strong>Granted By:</strong> {2}</p>
-                    <p><strong>Expires On:</strong> {3}</p>
-                    <p><strong>Reason:</strong> {4}</p>
-                    <p>You can access the document <a href="/app/document/{5}">here</a>.</p>
-                """).format(
-                    doc.title, 
-                    doc.document_type, 
-                    self.granted_by, 
-                    self.expires_on, 
-                    self.reason or _("Not specified"),
-                    self.document
-                )
-            })
-            notification.insert(ignore_permissions=True)
+            frappe.enqueue(
+                "pwp_project.pwp_project.doctype.document_access_grant.document_access_grant.notify_grant_job",
+                queue="short",
+                user=self.user,
+                document=self.document,
+                granted_by=self.granted_by,
+                expires_on=self.expires_on,
+                reason=self.reason,
+                enqueue_after_commit=True,
+                now=frappe.flags.in_test
+            )
             
     @staticmethod
     def get_active_grants_for_user(user):
         """Get all active access grants for a user"""
-        return frappe.get_all("Document Access Grant",
-            filters={
-                "user": user,
-                "is_active": 1,
-                "expires_on": [">=", now()]
-            },
-            fields=["name", "document", "granted_by", "granted_on", "expires_on", "reason"]
-        )
+        return frappe.db.sql("""
+            SELECT name, document, granted_by, granted_on, expires_on, reason
+            FROM `tabDocument Access Grant`
+            WHERE user = %s AND expires_on >= %s
+        """, (user, now()), as_dict=True)
         
     @staticmethod
     def get_grants_for_document(document):
         """Get all access grants for a document"""
-        return frappe.get_all("Document Access Grant",
-            filters={"document": document},
-            fields=["name", "user", "granted_by", "granted_on", "expires_on", "reason", "is_active"]
-        )
+        # A grant is active until it expires
+        return frappe.db.sql("""
+            SELECT name, user, granted_by, granted_on, expires_on, reason, expires_on >= %s AS is_active
+            FROM `tabDocument Access Grant`
+            WHERE document = %s
+        """, (now(), document), as_dict=True)
         
     @staticmethod
     def check_access_permission(document, user):
         """Check if a user has access to a document through grants"""
-        active_grants = frappe.get_all("Document Access Grant",
-            filters={
-                "document": document,
-                "user": user,
-                "is_active": 1,
-                "expires_on": [">=", now()]
-            }
-        )
+        return bool(frappe.db.sql("""
+            SELECT 1
+            FROM `tabDocument Access Grant`
+            WHERE document = %s AND user = %s AND expires_on >= %s
+            LIMIT 1
+        """, (document, user, now())))
         
-        return len(active_grants) > 0
+    @staticmethod
+    def get_cached_grants(user):
+        """Get the names of the documents a user has an active grant to"""
+        cache_key = ACTIVE_GRANTS_CACHE_KEY.format(user)
+        documents = frappe.cache().get_value(cache_key)
+        
+        if documents is None:
+            grants = frappe.db.sql("""
+                SELECT document, expires_on
+                FROM `tabDocument Access Grant`
+                WHERE user = %s AND expires_on >= %s
+            """, (user, now()), as_dict=True)
+            documents = sorted({grant.document for grant in grants})
+            
+            # Expire the cached set no later than the soonest grant
+            expires_in_sec = ACTIVE_GRANTS_CACHE_TTL
+            if grants:
+                seconds_left = (min(grant.expires_on for grant in grants) - now_datetime()).total_seconds()
+                expires_in_sec = max(1, min(expires_in_sec, int(seconds_left)))
+                
+            frappe.cache().set_value(cache_key, documents, expires_in_sec=expires_in_sec)
+            
+        return documents
         
     @staticmethod
     def cleanup_expired_grants():
         """Clean up expired access grants"""
-        expired_grants = frappe.get_all("Document Access Grant",
-            filters={"expires_on": ["<", now()]},
-            fields=["name"]
-        )
+        # Expired grants are never in a user's cached active grants, so no cache needs clearing
+        frappe.db.sql("DELETE FROM `tabDocument Access Grant` WHERE expires_on < %s", (now(),))
         
-        count = 0
-        for grant in expired_grants:
-            frappe.delete_doc("Document Access Grant", grant.name)
-            count += 1
-            
-        return count
+        return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
         
     @staticmethod
     def revoke_grant(grant_name, reason=""):
@@ -125,7 +129,7 @@ class DocumentAccessGrant(Document):
         grant = frappe.get_doc("Document Access Grant", grant_name)
         
         # Log the revocation
-        frappe.get_doc("Audit Log").log_action(
+        log_action(
             document_name=grant.document,
             action="Access Revoked",
             details=f"Access grant for user {grant.user} was revoked by {frappe.session.user}. Reason: {reason}"
@@ -133,5 +137,45 @@ class DocumentAccessGrant(Document):
         
         # Delete the grant
         grant.delete()
+        clear_active_grants_cache(grant.user)
         
-        return True
\ No newline at end of file
+        return True
+
+def notify_grant_job(user, document, granted_by, expires_on, reason=None):
+    """Send the notification for a new access grant (background job)"""
+    title, document_type = frappe.db.get_value("Document", document, ["title", "document_type"]) or (document, None)
+    
+    NotificationLog.create_notifications(
+        [user],
+        _("Access Granted to Document: {0}").format(title),
+        email_content=_("""
+            <p>You have been granted temporary access to a document:</p>
+            <p><strong>Title:</strong> {0}</p>
+            <p><strong>Type:</strong> {1}</p>
+            <p><strong>Granted By:</strong> {2}</p>
+            <p><strong>Expires On:</strong> {3}</p>
+            <p><strong>Reason:</strong> {4}</p>
+            <p>You can access the document <a href="/app/document/{5}">here</a>.</p>
+        """).format(
+            title,
+            document_type,
+            granted_by,
+            expires_on,
+            reason or _("Not specified"),
+            document
+        ),
+        document_type="Document",
+        document_name=document
+    )
+
+def clear_active_grants_cache(user):
+    """Drop a user's cached active grants"""
+    frappe.cache().delete_value(ACTIVE_GRANTS_CACHE_KEY.format(user))
+
+def on_doctype_update():
+    # Grant lookups filter on the document, the user and the expiry
+    frappe.db.add_index("Document Access Grant", ["document", "user", "expires_on"])
+    # A user's active grants are read by (user, expires_on), covering the document
+    frappe.db.add_index("Document Access Grant", ["user", "expires_on", "document"])
+    # Expired grants are cleaned up by expires_on alone
+    frappe.db.add_index("Document Access Grant", ["expires_on"])
@@ -3,8 +3,12 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import now
+from frappe.utils import cint, now
 from frappe import _
+from pwp_project.pwp_project.utils import is_system_manager, like_pattern
+
+INDEX_TAG_FIELDS = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+    "parent", "parenttype", "parentfield", "idx", "tag"]
 
 class DocumentIndex(Document):
     def validate(self):
@@ -14,6 +18,26 @@ class DocumentIndex(Document):
         if not self.indexed_on:
             self.indexed_on = now()
             
+    @staticmethod
+    def set_index_tags(index_name, tags):
+        """
+        Replace the tag rows of an index entry
+        """
+        frappe.db.delete("Document Index Tag", {"parent": index_name})
+        
+        tags = list(dict.fromkeys(tag for tag in tags if tag))
+        if not tags:
+            return
+            
+        timestamp = now()
+        owner = frappe.session.user
+        values = [
+            (frappe.generate_hash(length=10), timestamp, timestamp, owner, owner, 0,
+                index_name, "Document Index", "index_tags", idx, tag)
+            for idx, tag in enumerate(tags, 1)
+        ]
+        frappe.db.bulk_insert("Document Index Tag", fields=INDEX_TAG_FIELDS, values=values)
+        
     @staticmethod
     def search_documents(query, filters=None, limit=20):
         """
@@ -23,16 +47,16 @@ class DocumentIndex(Document):
             filters = {}
             
         # Apply security level filtering based on user role
-        if not frappe.has_role("System Manager"):
+        if not is_system_manager():
             filters["security_level"] = ["in", ["Public", "Internal"]]
             
         # Search in title and content
         or_conditions = []
         if query:
             or_conditions = [
-                ["title", "like", f"%{query}%"],
-                ["content", "like", f"%{query}%"],
-                ["tags", "like", f"%{query}%"]
+                ["title", "like", like_pattern(query)],
+                ["content", "like", like_pattern(query)],
+                ["tags", "like", like_pattern(query)]
             ]
             
         # Get documents
@@ -59,21 +83,48 @@ class DocumentIndex(Document):
         """
         Rebuild the entire document index
         """
-        # Get all documents
-        documents = frappe.get_all("Document", fields=["name"])
-        
-        # Delete existing index
+        # Delete rather than truncate, so the rebuild stays inside the transaction
+        frappe.db.delete("Document Index Tag")
         frappe.db.delete("Document Index")
         
-        # Rebuild index for each document
-        for doc in documents:
-            try:
-                document = frappe.get_doc("Document", doc.name)
-                document.update_index()
-            except Exception as e:
-                frappe.log_error(f"Error rebuilding index for document {doc.name}: {e}", "Document Index Rebuild")
-                
-        return len(documents)
+        # Copy every document into the index in one statement, deriving the same
+        # content and tags as Document.update_index
+        timestamp = now()
+        frappe.db.sql("""
+            INSERT INTO `tabDocument Index`
+                (name, creation, modified, modified_by, owner, docstatus,
+                document, title, content, document_type, status, security_level, tags, indexed_on)
+            SELECT
+                CONCAT('idx-', doc.name), %(timestamp)s, %(timestamp)s, %(modified_by)s, doc.owner, 0,
+                doc.name, doc.title,
+                CONCAT_WS(' ', doc.title, REGEXP_REPLACE(NULLIF(doc.description, ''), '<[^>]*>', '')),
+                doc.document_type, doc.status, doc.security_level,
+                COALESCE((
+                    SELECT GROUP_CONCAT(tag.tag ORDER BY tag.idx SEPARATOR ',')
+                    FROM `tabTag` tag
+                    WHERE tag.parent = doc.name AND tag.parenttype = 'Document' AND tag.parentfield = 'tags'
+                ), ''),
+                %(timestamp)s
+            FROM `tabDocument` doc
+        """, {"timestamp": timestamp, "modified_by": frappe.session.user})
+        indexed_count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+        
+        # One tag row per distinct tag of each document, named with a 10-character hex hash
+        # like the frappe.generate_hash(length=10) names the other tag writers use
+        frappe.db.sql("""
+            INSERT INTO `tabDocument Index Tag`
+                (name, creation, modified, modified_by, owner, docstatus,
+                parent, parenttype, parentfield, idx, tag)
+            SELECT
+                LEFT(MD5(CONCAT(tag.parent, tag.tag, RAND())), 10), %(timestamp)s, %(timestamp)s, %(modified_by)s, %(modified_by)s, 0,
+                CONCAT('idx-', tag.parent), 'Document Index', 'index_tags', MIN(tag.idx), tag.tag
+            FROM `tabTag` tag
+            JOIN `tabDocument` doc ON doc.name = tag.parent
+            WHERE tag.parenttype = 'Document' AND tag.parentfield = 'tags' AND tag.tag != ''
+            GROUP BY tag.parent, tag.tag
+        """, {"timestamp": timestamp, "modified_by": frappe.session.user})
+        
+        return indexed_count
         
     @staticmethod
     def get_document_suggestions(query, limit=10):
@@ -89,45 +140,37 @@ class DocumentIndex(Document):
             WHERE title LIKE %s
             ORDER BY title
             LIMIT %s
-        """, (f"%{query}%", limit), as_dict=True)
+        """, (like_pattern(query), limit), as_dict=True)
         
     @staticmethod
     def get_popular_tags(limit=20):
         """
         Get popular tags from document index
         """
-        tags = {}
-        
-        # Get all tags
-        index_records = frappe.get_all("Document Index", fields=["tags"])
-        
-        # Count tag occurrences
-        for record in index_records:
-            if record.tags:
-                tag_list = record.tags.split(",")
-                for tag in tag_list:
-                    tag = tag.strip()
-                    if tag:
-                        tags[tag] = tags.get(tag, 0) + 1
-                        
-        # Sort by count and return top tags
-        sorted_tags = sorted(tags.items(), key=lambda x: x[1], reverse=True)
-        return [tag[0] for tag in sorted_tags[:limit]]
+        return frappe.db.sql_list("""
+            SELECT tag
+            FROM `tabDocument Index Tag`
+            GROUP BY tag
+            ORDER BY COUNT(*) DESC
+            LIMIT %s
+        """, (cint(limit),))
         
     @staticmethod
     def get_documents_by_tag(tag, filters=None, limit=20):
         """
         Get documents by tag
         """
-        if not filters:
-            filters = {}
+        filters = [
+            ["Document Index", key] + (list(value) if isinstance(value, (list, tuple)) else ["=", value])
+            for key, value in (filters or {}).items()
+        ]
             
         # Apply security level filtering based on user role
-        if not frappe.has_role("System Manager"):
-            filters["security_level"] = ["in", ["Public", "Internal"]]
+        if not is_system_manager():
+            filters.append(["Document Index", "security_level", "in", ["Public", "Internal"]])
             
-        # Add tag filter
-        filters["tags"] = ["like", f"%{tag}%"]
+        # Match the tag exactly through the indexed tag rows, not a LIKE scan of the tags text
+        filters.append(["Document Index Tag", "tag", "=", tag])
         
         return frappe.get_all("Document Index",
             filters=filters,
@@ -143,17 +186,21 @@ class DocumentIndex(Document):
         """
         from frappe.utils import add_days
         
-        # Get index entries older than specified days
-        old_entries = frappe.get_all("Document Index",
-            filters={"indexed_on": ["<", add_days(now(), -days)]},
-            fields=["name", "document"]
-        )
+        cutoff = add_days(now(), -days)
+        
+        # Delete old index entries whose document is gone, and their tag rows
+        frappe.db.sql("""
+            DELETE dit
+            FROM `tabDocument Index Tag` dit
+            JOIN `tabDocument Index` di ON dit.parent = di.name
+            LEFT JOIN `tabDocument` d ON di.document = d.name
+            WHERE di.indexed_on < %(cutoff)s AND d.name IS NULL
+        """, {"cutoff": cutoff})
+        frappe.db.sql("""
+            DELETE di
+            FROM `tabDocument Index` di
+            LEFT JOIN `tabDocument` d ON di.document = d.name
+            WHERE di.indexed_on < %(cutoff)s AND d.name IS NULL
+        """, {"cutoff": cutoff})
         
-        cleaned_count = 0
-        for entry in old_entries:
-            # Check if document still exists
-            if not frappe.db.exists("Document", entry.document):
-                frappe.delete_doc("Document Index", entry.name)
-                cleaned_count += 1
-                
-        return cleaned_count
\ No newline at end of file
+        return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
\ No newline at end of file
@@ -0,0 +1,2 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
\ No newline at end of file
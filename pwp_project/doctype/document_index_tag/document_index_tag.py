@@ -0,0 +1,13 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+class DocumentIndexTag(Document):
+    pass
+
+def on_doctype_update():
+    # One row per tag of an index entry, looked up by tag
+    frappe.db.add_unique("Document Index Tag", ["parent", "tag"], constraint_name="unique_parent_tag")
+    frappe.db.add_index("Document Index Tag", ["tag", "parent"])
@@ -5,19 +5,26 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils import now, add_days
 from frappe import _
+from pwp_project.pwp_project.doctype.audit_log.audit_log import log_actions
+from pwp_project.pwp_project.doctype.document.document import VALID_STATUS_TRANSITIONS
+from pwp_project.pwp_project.doctype.document.document_search import clear_document_count_cache, clear_document_filters_cache
+from pwp_project.pwp_project.doctype.notification_log.notification_log import NotificationLog
 
 class DocumentType(Document):
     def validate(self):
-        self.validate_name()
         self.validate_file_types()
         
-    def validate_name(self):
-        """Validate that document type name is unique"""
-        if self.is_new():
-            existing = frappe.db.exists("Document Type", {"document_type_name": self.document_type_name})
-            if existing:
-                frappe.throw(_("Document Type with name {0} already exists").format(self.document_type_name))
-                
+    def on_update(self):
+        clear_document_filters_cache()
+        
+    def on_trash(self):
+        clear_document_filters_cache()
+        
+    def show_unique_validation_message(self, e):
+        """Report a duplicate name, which the unique document_type_name column rejects on insert"""
+        frappe.throw(_("Document Type with name {0} already exists").format(self.document_type_name),
+            frappe.UniqueValidationError)
+        
     def validate_file_types(self):
         """Validate allowed file types format"""
         if self.allowed_file_types:
@@ -28,6 +35,16 @@ class DocumentType(Document):
                     # Add dot if missing
                     pass
                     
+    def get_allowed_extensions(self):
+        """Get the allowed file extensions as a set of lowercase names without the dot"""
+        if getattr(self, "_allowed_extensions", None) is None:
+            self._allowed_extensions = frozenset(
+                ft.strip().lstrip(".").lower()
+                for ft in (self.allowed_file_types or "").split(",")
+                if ft.strip().lstrip(".")
+            )
+        return self._allowed_extensions
+        
     def get_reviewers(self):
         """Get list of reviewers for this document type"""
         if not self.reviewers:
@@ -74,6 +91,12 @@ class DocumentType(Document):
             fields=["name", "document_type_name", "auto_archive_days"]
         )
         
+        # Only statuses that may move to Archived are archived
+        archivable_statuses = [
+            status for status in ("Approved", "Published")
+            if "Archived" in VALID_STATUS_TRANSITIONS.get(status, ())
+        ]
+        
         archived_count = 0
         for doc_type in document_types:
             # Get documents that should be archived
@@ -81,82 +104,115 @@ class DocumentType(Document):
             documents = frappe.get_all("Document",
                 filters={
                     "document_type": doc_type.name,
-                    "status": ["in", ["Approved", "Published"]],
+                    "status": ["in", archivable_statuses],
                     "creation_date": ["<", archive_date]
                 },
                 fields=["name", "title"]
             )
+            if not documents:
+                continue
+                
+            # Archive the documents and their index entries in one statement each
+            names = tuple(doc.name for doc in documents)
+            timestamp = now()
+            try:
+                frappe.db.sql("""
+                    UPDATE `tabDocument`
+                    SET status = 'Archived', modified = %s, modified_by = %s
+                    WHERE name IN %s
+                """, (timestamp, frappe.session.user, names))
+                frappe.db.sql("""
+                    UPDATE `tabDocument Index`
+                    SET status = 'Archived', indexed_on = %s
+                    WHERE document IN %s
+                """, (timestamp, names))
+                
+                # Log the archivals
+                log_actions([
+                    (doc.name, "Auto Archived",
+                        f"Document '{doc.title}' was automatically archived after {doc_type.auto_archive_days} days")
+                    for doc in documents
+                ])
+                
+                archived_count += len(documents)
+            except Exception as e:
+                frappe.log_error(f"Error auto-archiving documents of type {doc_type.name}: {e}", "Document Auto Archive")
+                
+        if archived_count:
+            clear_document_count_cache()
             
-            # Archive each document
-            for doc in documents:
-                try:
-                    document = frappe.get_doc("Document", doc.name)
-                    document.status = "Archived"
-                    document.save()
-                    
-                    # Log the archival
-                    frappe.get_doc("Audit Log").log_action(
-                        document_name=doc.name,
-                        action="Auto Archived",
-                        details=f"Document '{doc.title}' was automatically archived after {doc_type.auto_archive_days} days"
-                    )
-                    
-                    archived_count += 1
-                except Exception as e:
-                    frappe.log_error(f"Error auto-archiving document {doc.name}: {e}", "Document Auto Archive")
-                    
         return archived_count
         
     @staticmethod
     def notify_reviewers(document_name):
         """Notify reviewers when a document is submitted for review"""
-        doc = frappe.get_doc("Document", document_name)
-        doc_type = frappe.get_doc("Document Type", doc.document_type)
-        
-        reviewers = doc_type.get_reviewers()
-        for reviewer in reviewers:
-            # Create notification
-            notification = frappe.get_doc({
-                "doctype": "Notification Log",
-                "subject": _("Document Submitted for Review: {0}").format(doc.title),
-                "for_user": reviewer,
-                "type": "Alert",
-                "document_type": "Document",
-                "document_name": doc.name,
-                "email_content": _("""
-                    <p>A document has been submitted for your review:</p>
-                    <p><strong>Title:</strong> {0}</p>
-                    <p><strong>Type:</strong> {1}</p>
-                    <p><strong>Owner:</strong> {2}</p>
-                    <p><strong>Security Level:</strong> {3}</p>
-                    <p>Please review the document <a href="/app/document/{4}">here</a>.</p>
-                """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name)
-            })
-            notification.insert(ignore_permissions=True)
+        doc, reviewers = _get_document_and_recipients(document_name, "reviewer")
+        if not doc:
+            return
+            
+        # The notification is the same for every reviewer, so insert them all at once
+        NotificationLog.create_notifications(
+            reviewers,
+            _("Document Submitted for Review: {0}").format(doc.title),
+            email_content=_("""
+                <p>A document has been submitted for your review:</p>
+                <p><strong>Title:</strong> {0}</p>
+                <p><strong>Type:</strong> {1}</p>
+                <p><strong>Owner:</strong> {2}</p>
+                <p><strong>Security Level:</strong> {3}</p>
+                <p>Please review the document <a href="/app/document/{4}">here</a>.</p>
+            """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name),
+            document_type="Document",
+            document_name=doc.name
+        )
             
     @staticmethod
     def notify_approvers(document_name):
         """Notify approvers when a document is submitted for approval"""
-        doc = frappe.get_doc("Document", document_name)
-        doc_type = frappe.get_doc("Document Type", doc.document_type)
-        
-        approvers = doc_type.get_approvers()
-        for approver in approvers:
-            # Create notification
-            notification = frappe.get_doc({
-                "doctype": "Notification Log",
-                "subject": _("Document Submitted for Approval: {0}").format(doc.title),
-                "for_user": approver,
-                "type": "Alert",
-                "document_type": "Document",
-                "document_name": doc.name,
-                "email_content": _("""
-                    <p>A document has been submitted for your approval:</p>
-                    <p><strong>Title:</strong> {0}</p>
-                    <p><strong>Type:</strong> {1}</p>
-                    <p><strong>Owner:</strong> {2}</p>
-                    <p><strong>Security Level:</strong> {3}</p>
-                    <p>Please approve or reject the document <a href="/app/document/{4}">here</a>.</p>
-                """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name)
-            })
-            notification.insert(ignore_permissions=True)
\ No newline at end of file
+        doc, approvers = _get_document_and_recipients(document_name, "approver")
+        if not doc:
+            return
+            
+        # The notification is the same for every approver, so insert them all at once
+        NotificationLog.create_notifications(
+            approvers,
+            _("Document Submitted for Approval: {0}").format(doc.title),
+            email_content=_("""
+                <p>A document has been submitted for your approval:</p>
+                <p><strong>Title:</strong> {0}</p>
+                <p><strong>Type:</strong> {1}</p>
+                <p><strong>Owner:</strong> {2}</p>
+                <p><strong>Security Level:</strong> {3}</p>
+                <p>Please approve or reject the document <a href="/app/document/{4}">here</a>.</p>
+            """).format(doc.title, doc.document_type, doc.owner, doc.security_level, doc.name),
+            document_type="Document",
+            document_name=doc.name
+        )
+
+# Child table holding each kind of notification recipient of a Document Type
+RECIPIENT_TABLES = {
+    "reviewer": ("Document Type Reviewer", "reviewers"),
+    "approver": ("Document Type Approver", "approvers")
+}
+
+def _get_document_and_recipients(document_name, recipient):
+    """
+    Get the fields a notification shows for a document, and the reviewers or
+    approvers of its document type, in one query
+    
+    Returns:
+        tuple: (document, recipients); document is None when there is no one to notify
+    """
+    doctype, parentfield = RECIPIENT_TABLES[recipient]
+    rows = frappe.db.sql("""
+        SELECT d.name, d.title, d.owner, d.security_level, d.document_type, r.{recipient} AS recipient
+        FROM `tabDocument` d
+        JOIN `tab{doctype}` r
+            ON r.parent = d.document_type AND r.parenttype = 'Document Type' AND r.parentfield = %s
+        WHERE d.name = %s AND r.{recipient} IS NOT NULL
+        ORDER BY r.idx
+    """.format(recipient=recipient, doctype=doctype), (parentfield, document_name), as_dict=True)
+    
+    if not rows:
+        return None, []
+    return rows[0], [row.recipient for row in rows]
@@ -54,9 +54,11 @@ class DocumentVersion(Document):
     def ensure_only_one_current_version(self):
         if self.is_current:
             # Set all other versions of this document as not current
-            frappe.db.set_value("Document Version", 
-                {"document": self.document, "name": ["!=", self.name]}, 
-                "is_current", 0)
+            frappe.db.sql("""
+                UPDATE `tabDocument Version`
+                SET is_current = 0, modified = %s
+                WHERE document = %s AND is_current = 1 AND name != %s
+            """, (frappe.utils.now(), self.document, self.name))
                 
     def create_audit_log(self, action):
         audit_log = frappe.get_doc({
@@ -220,4 +222,10 @@ def restore_to_document(docname):
 def compare_with_version(docname, other_version_name):
     """Compare this version with another version"""
     version = frappe.get_doc("Document Version", docname)
-    return version.compare_with_version(other_version_name)
\ No newline at end of file
+    return version.compare_with_version(other_version_name)
+
+def on_doctype_update():
+    # The current version of a document is looked up and reset by (document, is_current)
+    frappe.db.add_index("Document Version", ["document", "is_current"])
+    # Latest-version and next-number lookups seek on (document, version_number)
+    frappe.db.add_index("Document Version", ["document", "version_number"])
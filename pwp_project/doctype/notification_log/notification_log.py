@@ -38,12 +38,18 @@ class NotificationLog(Document):
     @staticmethod
     def mark_notification_as_read(notification_name):
         """Mark a notification as read"""
-        frappe.db.set_value("Notification Log", notification_name, "read", 1)
+        frappe.db.set_value("Notification Log", notification_name, "read", 1, update_modified=False)
         
     @staticmethod
     def mark_all_notifications_as_read(user):
         """Mark all notifications for a user as read"""
-        frappe.db.set_value("Notification Log", {"for_user": user, "read": 0}, "read", 1)
+        # One UPDATE for all of them, rather than set_value's update per matching row;
+        # like mark_notification_as_read, marking read leaves modified untouched
+        frappe.db.sql("""
+            UPDATE `tabNotification Log`
+            SET `read` = 1
+            WHERE for_user = %s AND `read` = 0
+        """, (user,))
         
     @staticmethod
     def send_notification_email(notification_name):
@@ -74,15 +80,33 @@ class NotificationLog(Document):
         """Clean up old notifications"""
         from frappe.utils import add_days
         
-        # Get notifications older than specified days
-        old_notifications = frappe.get_all("Notification Log",
-            filters={"creation": ["<", add_days(now(), -days)]},
-            fields=["name"]
-        )
+        # Notification Log has no delete hooks, so old notifications are deleted in one statement
+        frappe.db.sql("DELETE FROM `tabNotification Log` WHERE creation < %s", (add_days(now(), -days),))
+        
+        return frappe.db.sql("SELECT ROW_COUNT()")[0][0]
         
-        count = 0
-        for notification in old_notifications:
-            frappe.delete_doc("Notification Log", notification.name)
-            count += 1
+    @staticmethod
+    def create_notifications(users, subject, email_content=None, document_type=None, document_name=None, type="Alert"):
+        """Create the same notification for several users with one INSERT"""
+        users = list(dict.fromkeys(user for user in users if user))
+        if not users:
+            return []
             
-        return count
\ No newline at end of file
+        timestamp = now()
+        owner = frappe.session.user
+        fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+            "subject", "for_user", "type", "document_type", "document_name", "email_content", "read", "sent"]
+        values = [
+            (frappe.generate_hash(length=10), timestamp, timestamp, owner, owner, 0,
+                subject, user, type, document_type, document_name, email_content, 0, 0)
+            for user in users
+        ]
+        
+        frappe.db.bulk_insert("Notification Log", fields=fields, values=values, ignore_duplicates=True)
+        return [row[0] for row in values]
+
+def on_doctype_update():
+    # A user's unread notifications are read and updated by (for_user, read), newest first.
+    # add_index does not quote column names and READ is a reserved word in MariaDB
+    frappe.db.add_index("Notification Log", ["for_user", "`read`", "creation"],
+        index_name="for_user_read_creation_index")
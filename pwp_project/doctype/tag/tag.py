@@ -3,18 +3,24 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint
+from frappe import _
+
+# Popular tags are counted at most every five minutes
+POPULAR_TAGS_CACHE_PREFIX = "tag:popular:"
+POPULAR_TAGS_CACHE_TTL = 300
 
 class Tag(Document):
-    def validate(self):
-        self.validate_name()
+    def on_update(self):
+        frappe.cache().delete_keys(POPULAR_TAGS_CACHE_PREFIX)
+        
+    def on_trash(self):
+        frappe.cache().delete_keys(POPULAR_TAGS_CACHE_PREFIX)
+        
+    def show_unique_validation_message(self, e):
+        """Report a duplicate tag, which the unique tag column rejects on insert"""
+        frappe.throw(_("Tag with name {0} already exists").format(self.tag), frappe.UniqueValidationError)
         
-    def validate_name(self):
-        """Validate that tag name is unique"""
-        if self.is_new():
-            existing = frappe.db.exists("Tag", {"tag": self.tag})
-            if existing:
-                frappe.throw(_("Tag with name {0} already exists").format(self.tag))
-                
     @staticmethod
     def get_active_tags():
         """Get all active tags"""
@@ -26,24 +32,37 @@ class Tag(Document):
         
     @staticmethod
     def get_popular_tags(limit=20):
-        """Get popular tags based on usage in documents"""
-        # This is a simplified implementation
-        # In a real system, you would count tag usage in documents
-        return frappe.get_all("Tag",
-            filters={"is_active": 1},
-            fields=["name", "tag", "description", "color"],
-            order_by="tag",
-            limit=limit
-        )
+        """Get the active tags used by the most documents"""
+        limit = cint(limit) or 20
+        cache_key = POPULAR_TAGS_CACHE_PREFIX + str(limit)
+        popular_tags = frappe.cache().get_value(cache_key)
+        
+        if popular_tags is None:
+            popular_tags = frappe.db.sql("""
+                SELECT t.name, t.tag, t.description, t.color, usage_count.count AS usage_count
+                FROM (
+                    SELECT tag, COUNT(*) AS count
+                    FROM `tabDocument Index Tag`
+                    GROUP BY tag
+                ) usage_count
+                JOIN `tabTag` t ON t.tag = usage_count.tag AND t.is_active = 1
+                ORDER BY usage_count.count DESC, t.tag
+                LIMIT %s
+            """, (limit,), as_dict=True)
+            frappe.cache().set_value(cache_key, popular_tags, expires_in_sec=POPULAR_TAGS_CACHE_TTL)
+            
+        return popular_tags
         
     @staticmethod
     def get_documents_by_tag(tag_name, limit=20):
         """Get documents by tag"""
-        # This is a simplified implementation
-        # In a real system, you would query documents with this tag
-        return frappe.get_all("Document",
-            filters={"tags": ["like", f"%{tag_name}%"]},
-            fields=["name", "title", "document_type", "status", "security_level", "owner"],
-            order_by="modified desc",
-            limit=limit
-        )
\ No newline at end of file
+        # Match the tag exactly through the indexed Document Index Tag rows
+        return frappe.db.sql("""
+            SELECT d.name, d.title, d.document_type, d.status, d.security_level, d.owner
+            FROM `tabDocument Index Tag` dit
+            JOIN `tabDocument Index` di ON di.name = dit.parent
+            JOIN `tabDocument` d ON d.name = di.document
+            WHERE dit.tag = %s
+            ORDER BY d.modified DESC
+            LIMIT %s
+        """, (tag_name, cint(limit)), as_dict=True)
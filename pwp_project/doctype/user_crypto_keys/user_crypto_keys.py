@@ -6,7 +6,6 @@ from frappe.model.document import Document
 import hashlib
 import binascii
 from datetime import datetime, timedelta
-from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
 
 class UserCryptoKeys(Document):
     def validate(self):
@@ -80,6 +79,8 @@ class UserCryptoKeys(Document):
         Rotate the cryptographic keys by generating new ones
         """
         try:
+            from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
+
             # Determine algorithm parameters
             algorithm = new_key_algorithm or self.key_algorithm or "RSA"
 
@@ -165,6 +166,7 @@ class UserCryptoKeys(Document):
             raise ValueError("Password required to decrypt private key")
 
         if keys.private_key_encrypted:
+            from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
             return DigitalSignature.decrypt_private_key(keys.private_key, password)
         else:
             return keys.private_key
@@ -184,6 +186,7 @@ class UserCryptoKeys(Document):
 
             # Encrypt private key if password is provided
             if password:
+                from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
                 private_key_pem = DigitalSignature.encrypt_private_key(private_key_pem, password)
                 keys.private_key_encrypted = 1
             else:
@@ -213,6 +216,8 @@ class UserCryptoKeys(Document):
         Generate and store cryptographic keys for a user
         """
         try:
+            from pwp_project.pwp_project.doctype.digital_signature.digital_signature import DigitalSignature
+
             # Generate key pair
             if algorithm.upper() == 'RSA':
                 private_key_pem, public_key_pem = DigitalSignature.generate_rsa_key_pair(key_size)
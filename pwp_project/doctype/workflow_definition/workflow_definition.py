@@ -1,9 +1,16 @@
 import frappe
 from frappe.model.document import Document
 from frappe import _
+from functools import cached_property
+
+# Document types that have at least one active workflow definition
+DOCTYPES_WITH_WORKFLOW_CACHE_KEY = "workflow:doctypes_with_active"
 
 class WorkflowDefinition(Document):
     def validate(self):
+        # Steps may have been edited since the lookup was built
+        self.__dict__.pop("_steps_by_order", None)
+
         self.validate_steps()
         self.validate_default_workflow()
         self.validate_transitions()
@@ -51,6 +58,8 @@ class WorkflowDefinition(Document):
                 frappe.throw(_("There can be only one default workflow for document type {0}").format(self.document_type))
     
     def on_update(self):
+        clear_document_types_with_workflow_cache()
+
         if self.is_active:
             self.update_document_type_workflow()
         else:
@@ -60,6 +69,9 @@ class WorkflowDefinition(Document):
                 doc_type.workflow = None
                 doc_type.save()
     
+    def on_trash(self):
+        clear_document_types_with_workflow_cache()
+    
     def update_document_type_workflow(self):
         doc_type = frappe.get_doc("Document Type", self.document_type)
         doc_type.workflow = self.name
@@ -71,11 +83,12 @@ class WorkflowDefinition(Document):
                 return step
         return None
     
+    @cached_property
+    def _steps_by_order(self):
+        return {step.step_order: step for step in self.steps}
+
     def get_step_by_order(self, order):
-        for step in self.steps:
-            if step.step_order == order:
-                return step
-        return None
+        return self._steps_by_order.get(order)
     
     def get_step_by_name(self, name):
         for step in self.steps:
@@ -233,6 +246,28 @@ class WorkflowDefinition(Document):
         
         return False
 
+def get_document_types_with_workflow():
+    """
+    Get the set of document types that have an active workflow definition
+    """
+    return frappe.cache().get_value(DOCTYPES_WITH_WORKFLOW_CACHE_KEY, generator=lambda: set(frappe.db.sql_list("""
+        SELECT DISTINCT document_type
+        FROM `tabWorkflow Definition`
+        WHERE is_active = 1
+    """)))
+
+def clear_document_types_with_workflow_cache():
+    frappe.cache().delete_value(DOCTYPES_WITH_WORKFLOW_CACHE_KEY)
+
+def get_workflow_definition(name):
+    """
+    Get a Workflow Definition from the document cache
+
+    Frappe clears the cached copy whenever the definition is saved or deleted,
+    so callers must treat the returned document as read-only.
+    """
+    return frappe.get_cached_doc("Workflow Definition", name)
+
 @frappe.whitelist()
 def get_workflow_definitions(doctype=None):
     filters = {"is_active": 1}
@@ -247,7 +282,7 @@ def get_default_workflow_definition(doctype):
 
 @frappe.whitelist()
 def get_workflow_definition_details(workflow_name):
-    workflow_def = frappe.get_doc("Workflow Definition", workflow_name)
+    workflow_def = get_workflow_definition(workflow_name)
     
     # Get steps with their details
     steps = []
@@ -327,7 +362,7 @@ def get_workflow_definition_details(workflow_name):
 
 @frappe.whitelist()
 def test_workflow_conditions(workflow_name, document_name):
-    workflow_def = frappe.get_doc("Workflow Definition", workflow_name)
+    workflow_def = get_workflow_definition(workflow_name)
     document = frappe.get_doc("Document", document_name)
     
     return workflow_def.evaluate_workflow_conditions(document)
\ No newline at end of file
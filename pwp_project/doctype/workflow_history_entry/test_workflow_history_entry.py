@@ -0,0 +1,127 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+import json
+import unittest
+from frappe.utils import add_to_date, now_datetime
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import add_history_entry, get_history
+from pwp_project.patches.v0_0_1.migrate_workflow_history_to_entries import execute as migrate_workflow_history
+
+class TestWorkflowHistoryEntry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The history column was dropped from the doctype; sites being migrated still have it
+        cls.added_history_column = not frappe.db.has_column("Workflow Instance", "history")
+        if cls.added_history_column:
+            frappe.db.sql_ddl("ALTER TABLE `tabWorkflow Instance` ADD COLUMN history LONGTEXT")
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.added_history_column:
+            frappe.db.sql_ddl("ALTER TABLE `tabWorkflow Instance` DROP COLUMN history")
+
+    def setUp(self):
+        self.instances = []
+
+    def tearDown(self):
+        # Clean up test data
+        for instance in self.instances:
+            frappe.db.delete("Workflow History Entry", {"workflow_instance": instance})
+            frappe.db.delete("Workflow Instance", {"name": instance})
+
+    def create_instance(self, history=None):
+        """Insert a bare Workflow Instance row, skipping the controller's own history entry"""
+        instance = frappe.get_doc({
+            "doctype": "Workflow Instance",
+            "workflow_definition": "Test Workflow",
+            "document": "TEST-DOC-001",
+            "status": "In Progress",
+            "current_step": "Review",
+            "started_by": "Administrator",
+            "started_on": now_datetime()
+        })
+        instance.db_insert()
+        self.instances.append(instance.name)
+
+        if history is not None:
+            frappe.db.sql("UPDATE `tabWorkflow Instance` SET history = %s WHERE name = %s", (history, instance.name))
+
+        return instance.name
+
+    def get_history_column(self, instance):
+        return frappe.db.sql("SELECT history FROM `tabWorkflow Instance` WHERE name = %s", instance)[0][0]
+
+    def test_add_history_entry(self):
+        """Test appending an entry to a workflow instance's history"""
+        instance = self.create_instance()
+
+        entry_name = add_history_entry(instance, "Approved", user="Administrator", step="Review",
+            comment="Looks good", from_state="Review", to_state="Approved")
+
+        self.assertTrue(frappe.db.exists("Workflow History Entry", entry_name))
+
+        history = get_history(instance)
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0].action, "Approved")
+        self.assertEqual(history[0].user, "Administrator")
+        self.assertEqual(history[0].from_state, "Review")
+        self.assertEqual(history[0].to_state, "Approved")
+
+    def test_get_history_paging(self):
+        """Test reading a workflow instance's history one page at a time"""
+        instance = self.create_instance()
+
+        # Spread the timestamps so the order does not depend on insert timing
+        start = now_datetime()
+        for index in range(5):
+            entry_name = add_history_entry(instance, f"Action {index}")
+            frappe.db.set_value("Workflow History Entry", entry_name, "timestamp", add_to_date(start, seconds=index))
+
+        first_page = get_history(instance, limit=2)
+        second_page = get_history(instance, limit=2, start=2)
+        last_page = get_history(instance, limit=2, start=4)
+
+        self.assertEqual([entry.action for entry in first_page], ["Action 0", "Action 1"])
+        self.assertEqual([entry.action for entry in second_page], ["Action 2", "Action 3"])
+        self.assertEqual([entry.action for entry in last_page], ["Action 4"])
+
+        latest = get_history(instance, order_by="timestamp desc", limit=1)
+        self.assertEqual(latest[0].action, "Action 4")
+
+        filtered = get_history(instance, filters={"action": "Action 3"})
+        self.assertEqual(len(filtered), 1)
+
+    def test_migrate_history_json(self):
+        """Test moving the history JSON into entries, keeping rows that cannot be parsed"""
+        migrated = self.create_instance(json.dumps([
+            {"action": "Workflow Started", "user": "Administrator", "timestamp": "2025-01-01 10:00:00"},
+            {"action": "Approved", "user": "Administrator", "timestamp": "2025-01-02 10:00:00",
+                "from_state": "Review", "to_state": "Approved", "comment": "Looks good"}
+        ]))
+        malformed = self.create_instance("[{not json")
+
+        migrate_workflow_history()
+
+        history = get_history(migrated)
+        self.assertEqual([entry.action for entry in history], ["Workflow Started", "Approved"])
+        self.assertEqual(history[1].to_state, "Approved")
+        self.assertEqual(history[1].comment, "Looks good")
+        self.assertIsNone(self.get_history_column(migrated))
+
+        # The malformed row keeps its JSON and gets no entries
+        self.assertEqual(self.get_history_column(malformed), "[{not json")
+        self.assertEqual(get_history(malformed), [])
+
+    def test_migrate_history_rerun(self):
+        """Test that running the migration again does not duplicate entries"""
+        history_json = json.dumps([{"action": "Workflow Started", "user": "Administrator"}])
+        instance = self.create_instance(history_json)
+
+        migrate_workflow_history()
+
+        # Instances that already have entries are skipped even if their JSON is still set
+        frappe.db.sql("UPDATE `tabWorkflow Instance` SET history = %s WHERE name = %s", (history_json, instance))
+        migrate_workflow_history()
+
+        self.assertEqual(len(get_history(instance)), 1)
@@ -0,0 +1,41 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+HISTORY_FIELDS = ["timestamp", "action", "user", "step", "from_state", "to_state", "description", "comment"]
+
+class WorkflowHistoryEntry(Document):
+    pass
+
+def add_history_entry(workflow_instance, action, user=None, step=None, description=None, comment=None, from_state=None, to_state=None):
+    """
+    Append an entry to a workflow instance's history without saving the instance
+    """
+    entry = frappe.get_doc({
+        "doctype": "Workflow History Entry",
+        "workflow_instance": workflow_instance,
+        "timestamp": frappe.utils.now_datetime(),
+        "user": user or frappe.session.user,
+        "action": action,
+        "step": step,
+        "from_state": from_state,
+        "to_state": to_state,
+        "description": description,
+        "comment": comment
+    })
+    entry.insert(ignore_permissions=True)
+    return entry.name
+
+def get_history(workflow_instance, filters=None, order_by="timestamp asc", limit=None, start=0):
+    """
+    Get the history entries of a workflow instance, optionally one page at a time
+    """
+    return frappe.get_all("Workflow History Entry",
+        filters=dict(filters or {}, workflow_instance=workflow_instance),
+        fields=HISTORY_FIELDS,
+        order_by=order_by,
+        limit_start=start,
+        limit_page_length=limit
+    )
@@ -57,7 +57,8 @@ function load_pending_actions(frm) {
     frappe.call({
         method: 'pwp_project.pwp_project.doctype.workflow_instance.workflow_instance.get_workflow_instance_details',
         args: {
-            workflow_instance_name: frm.doc.name
+            workflow_instance_name: frm.doc.name,
+            include: ['pending_actions']
         },
         callback: function(r) {
             if (r.message && r.message.pending_actions) {
@@ -288,7 +289,8 @@ function load_workflow_visualization(frm) {
     frappe.call({
         method: 'pwp_project.pwp_project.doctype.workflow_instance.workflow_instance.get_workflow_instance_details',
         args: {
-            workflow_instance_name: frm.doc.name
+            workflow_instance_name: frm.doc.name,
+            include: []
         },
         callback: function(r) {
             if (r.message) {
@@ -3,8 +3,21 @@ from frappe.model.document import Document
 from frappe import _
 import json
 from datetime import datetime, timedelta
-import uuid
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition, get_document_types_with_workflow
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import add_history_entry, get_history
 from pwp_project.pwp_project.workflow import WorkflowRouting, WorkflowStateMachine, WorkflowState, WorkflowActions, WorkflowNotifications
+from pwp_project.pwp_project.workflow.state_machine import OPEN_WORKFLOW_STATUSES
+
+# Optional parts of the instance details; callers may ask for a subset
+WORKFLOW_DETAIL_SECTIONS = frozenset({"pending_actions", "history"})
+
+def parse_detail_sections(include=None):
+    """
+    Resolve the `include` argument of the details endpoints to a set of sections
+    """
+    if include is None:
+        return WORKFLOW_DETAIL_SECTIONS
+    return WORKFLOW_DETAIL_SECTIONS.intersection(frappe.parse_json(include) or [])
 
 class WorkflowInstance(Document):
     def validate(self):
@@ -17,7 +30,7 @@ class WorkflowInstance(Document):
             frappe.throw(_("Workflow Definition {0} does not exist").format(self.workflow_definition))
 
         # Check if workflow definition is active
-        workflow_def = frappe.get_doc("Workflow Definition", self.workflow_definition)
+        workflow_def = get_workflow_definition(self.workflow_definition)
         if not workflow_def.is_active:
             frappe.throw(_("Workflow Definition {0} is not active").format(self.workflow_definition))
 
@@ -38,37 +51,17 @@ class WorkflowInstance(Document):
     def start_workflow(self):
         # Use state machine to transition to In Progress
         WorkflowStateMachine.transition_to(self, WorkflowState.IN_PROGRESS, frappe.session.user)
-        self.initialize_history()
         self.save()
 
-        workflow_def = frappe.get_doc("Workflow Definition", self.workflow_definition)
+        workflow_def = get_workflow_definition(self.workflow_definition)
         start_step = workflow_def.get_start_step()
 
         if start_step:
             self.process_step(start_step)
             self.add_to_history("Workflow Started", f"Workflow started by {frappe.session.user}")
 
-    def initialize_history(self):
-        if not self.history:
-            self.history = json.dumps([])
-
     def add_to_history(self, action, description):
-        if not self.history:
-            self.initialize_history()
-
-        history_list = json.loads(self.history)
-        history_entry = {
-            "id": str(uuid.uuid4()),
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "description": description,
-            "user": frappe.session.user,
-            "step": self.current_step
-        }
-
-        history_list.append(history_entry)
-        self.history = json.dumps(history_list)
-        self.save()
+        add_history_entry(self.name, action, step=self.current_step, description=description)
 
     def process_step(self, step):
         assignees = WorkflowRouting.get_step_assignees(step, self.document)
@@ -181,10 +174,7 @@ class WorkflowInstance(Document):
         pass
 
     def get_workflow_history(self):
-        if not self.history:
-            return []
-
-        return json.loads(self.history)
+        return get_history(self.name)
 
     def cancel_workflow(self, reason):
         if self.status in ["Completed", "Cancelled"]:
@@ -207,7 +197,7 @@ def check_step_timeout_job(workflow_instance, step_name, timeout_date):
 
     wf_instance = frappe.get_doc("Workflow Instance", workflow_instance)
     if wf_instance.status != "Completed" and wf_instance.status != "Rejected":
-        workflow_def = frappe.get_doc("Workflow Definition", wf_instance.workflow_definition)
+        workflow_def = get_workflow_definition(wf_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(wf_instance.current_step)
 
         if current_step and current_step.step_name == step_name:
@@ -228,15 +218,17 @@ def escalate_step(workflow_instance, step):
 @frappe.whitelist()
 def start_workflow(document_name, workflow_definition=None):
     if not workflow_definition:
-        document = frappe.get_doc("Document", document_name)
-        workflow_definition = frappe.db.get_value("Document Type", document.document_type, "workflow")
+        # Most document types have no workflow; skip the lookups for those
+        document_type = frappe.db.get_value("Document", document_name, "document_type")
+        if document_type in get_document_types_with_workflow():
+            workflow_definition = frappe.db.get_value("Document Type", document_type, "workflow")
 
     if not workflow_definition:
         frappe.throw(_("No workflow definition found for document {0}").format(document_name))
 
     existing_workflow = frappe.db.exists("Workflow Instance", {
         "document": document_name,
-        "status": ["in", ["Pending", "In Progress"]]
+        "status": ["in", OPEN_WORKFLOW_STATUSES]
     })
 
     if existing_workflow:
@@ -263,7 +255,7 @@ def execute_workflow_action(workflow_instance, action_name):
 def get_workflow_status(document_name):
     workflow_instance = frappe.db.get_value("Workflow Instance", {
         "document": document_name,
-        "status": ["in", ["Pending", "In Progress"]]
+        "status": ["in", OPEN_WORKFLOW_STATUSES]
     }, ["name", "status", "current_step", "workflow_definition"])
 
     if workflow_instance:
@@ -325,7 +317,7 @@ def reassign_workflow_step(workflow_instance, new_assignee):
         wf_instance.save()
 
         # Create a new task for the new assignee
-        workflow_def = frappe.get_doc("Workflow Definition", wf_instance.workflow_definition)
+        workflow_def = get_workflow_definition(wf_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(wf_instance.current_step)
 
         if current_step:
@@ -339,16 +331,17 @@ def reassign_workflow_step(workflow_instance, new_assignee):
     return wf_instance.current_assignees
 
 @frappe.whitelist()
-def get_workflow_instance_details(workflow_instance_name):
+def get_workflow_instance_details(workflow_instance_name, include=None):
+    include = parse_detail_sections(include)
     wf_instance = frappe.get_doc("Workflow Instance", workflow_instance_name)
-    workflow_def = frappe.get_doc("Workflow Definition", wf_instance.workflow_definition)
+    workflow_def = get_workflow_definition(wf_instance.workflow_definition)
 
     # Get current step details
     current_step = workflow_def.get_step_by_order(wf_instance.current_step)
 
     # Get pending actions for current user
     pending_actions = []
-    if current_step and wf_instance.status == "In Progress":
+    if "pending_actions" in include and current_step and wf_instance.status == "In Progress":
         pending_actions = WorkflowActions.get_available_actions(wf_instance, frappe.session.user)
 
     return {
@@ -356,5 +349,5 @@ def get_workflow_instance_details(workflow_instance_name):
         "workflow_definition": workflow_def,
         "current_step": current_step,
         "pending_actions": pending_actions,
-        "history": wf_instance.get_workflow_history()
+        "history": wf_instance.get_workflow_history() if "history" in include else []
     }
@@ -371,4 +371,8 @@ class WorkflowStep(Document):
             if next_step:
                 next_steps.append(frappe.get_doc("Workflow Step", next_step[0].name))
                 
-        return next_steps
\ No newline at end of file
+        return next_steps
+
+def on_doctype_update():
+    # Current-step lookups join on (parent, step_order)
+    frappe.db.add_index("Workflow Step", ["parent", "step_order"])
@@ -0,0 +1,85 @@
+# Copyright (c) 2025, Government Agency and contributors
+# For license information, please see license.txt
+
+import frappe
+import hashlib
+import json
+
+try:
+    # Optional C JSON parser, several times faster than the stdlib one
+    import orjson
+except ImportError:
+    orjson = None
+
+# InnoDB's default innodb_ft_min_token_size
+FULLTEXT_MIN_WORD_LENGTH = 3
+
+def is_system_manager(user=None):
+    """Check whether a user has the System Manager role, once per request"""
+    user = user or frappe.session.user
+
+    cache = getattr(frappe.local, "system_manager_cache", None)
+    if cache is None:
+        cache = frappe.local.system_manager_cache = {}
+
+    if user not in cache:
+        cache[user] = "System Manager" in frappe.get_roles(user)
+
+    return cache[user]
+
+def has_permission_cached(doctype, ptype="read", docname=None, user=None):
+    """Check a permission through frappe.has_permission, once per request"""
+    user = user or frappe.session.user
+
+    cache = getattr(frappe.local, "permission_cache", None)
+    if cache is None:
+        cache = frappe.local.permission_cache = {}
+
+    key = (doctype, ptype, docname, user)
+    if key not in cache:
+        cache[key] = bool(frappe.has_permission(doctype, ptype, docname, user=user))
+
+    return cache[key]
+
+def like_pattern(value):
+    """Build a LIKE pattern matching `value` anywhere, with its own % and _ matched literally"""
+    value = str(value).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{value}%"
+
+def make_etag(*parts):
+    """Build an ETag value from the parts that determine a response"""
+    return hashlib.md5(frappe.as_json(parts).encode("utf-8")).hexdigest()
+
+def set_etag(etag):
+    """Send `etag` with the response; return True if the client already holds it"""
+    response_headers = getattr(frappe.local, "response_headers", None)
+    if response_headers is not None:
+        response_headers.set("ETag", f'"{etag}"')
+
+    request = getattr(frappe.local, "request", None)
+    return bool(request is not None and request.if_none_match.contains(etag))
+
+def not_modified():
+    """Answer the current request with 304 Not Modified"""
+    frappe.local.response.http_status_code = 304
+
+def json_loads(data):
+    """Parse JSON with orjson when it is installed; raises json.JSONDecodeError on bad input"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(data, indent=False):
+    """
+    Serialize to a JSON string with orjson when it is installed; values JSON can't hold go through str()
+
+    The result parses to the same data as json.dumps(..., default=str) but is not the same text:
+    orjson writes compact separators ({"a":1}) and leaves non-ASCII characters unescaped
+    """
+    if orjson:
+        # Let datetimes fall through to str() too, so they serialize as json.dumps(default=str) does
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=str, option=option).decode()
+    return json.dumps(data, indent=2 if indent else None, default=str)
@@ -3,6 +3,8 @@ from frappe import _
 from frappe.model.document import Document
 import json
 from datetime import datetime, timedelta
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import add_history_entry
 from .state_machine import WorkflowStateMachine, WorkflowState
 from .routing import WorkflowRouting
 
@@ -21,7 +23,7 @@ class WorkflowActions:
             frappe.throw(_("You are not allowed to approve this workflow"))
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -65,7 +67,7 @@ class WorkflowActions:
             frappe.throw(_("You are not allowed to reject this workflow"))
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -92,7 +94,7 @@ class WorkflowActions:
             frappe.throw(_("You are not allowed to request changes for this workflow"))
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -134,7 +136,7 @@ class WorkflowActions:
             frappe.throw(_("You are not allowed to forward this workflow"))
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -183,7 +185,7 @@ class WorkflowActions:
             frappe.throw(_("You are not allowed to skip this step"))
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -222,7 +224,7 @@ class WorkflowActions:
         """
         Check if a user can approve the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -255,7 +257,7 @@ class WorkflowActions:
         """
         Check if a user can reject the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -288,7 +290,7 @@ class WorkflowActions:
         """
         Check if a user can request changes for the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -321,7 +323,7 @@ class WorkflowActions:
         """
         Check if a user can forward the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -354,7 +356,7 @@ class WorkflowActions:
         """
         Check if a user can skip the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -398,17 +400,7 @@ class WorkflowActions:
             workflow_instance.add_comment("Comment", f"{action} - {step_name}")
         
         # Update workflow history
-        history = workflow_instance.history or []
-        history.append({
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "step": step_name,
-            "user": user,
-            "comment": comment
-        })
-        
-        workflow_instance.history = json.dumps(history)
-        workflow_instance.save()
+        add_history_entry(workflow_instance.name, action, user, step=step_name, comment=comment)
     
     @staticmethod
     def send_action_notifications(workflow_instance, action, user, comment=None):
@@ -416,7 +408,7 @@ class WorkflowActions:
         Send notifications for a workflow action
         """
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -468,7 +460,7 @@ class WorkflowActions:
             recipients.append(workflow_instance.started_by)
         
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -3,7 +3,8 @@ from frappe import _
 from frappe.model.document import Document
 import json
 from datetime import datetime, timedelta
-from .state_machine import WorkflowStateMachine, WorkflowState
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition
+from .state_machine import WorkflowStateMachine, WorkflowState, OPEN_WORKFLOW_STATUSES
 from .routing import WorkflowRouting
 from .actions import WorkflowActions
 
@@ -46,7 +47,7 @@ class WorkflowNotifications:
         """
         Notify users when a workflow is started
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         start_step = workflow_def.get_start_step()
 
         if not start_step:
@@ -342,7 +343,7 @@ class WorkflowNotifications:
         wf_instance = frappe.get_doc("Workflow Instance", workflow_instance)
 
         if wf_instance.status not in ["Completed", "Rejected", "Cancelled"]:
-            workflow_def = frappe.get_doc("Workflow Definition", wf_instance.workflow_definition)
+            workflow_def = get_workflow_definition(wf_instance.workflow_definition)
             current_step = workflow_def.get_step_by_order(wf_instance.current_step)
 
             if current_step and current_step.step_name == step_name:
@@ -360,14 +361,11 @@ class WorkflowNotifications:
             participants.add(workflow_instance.started_by)
 
         # Add users from workflow history
-        history = workflow_instance.history or "[]"
-        try:
-            history_data = json.loads(history)
-            for entry in history_data:
-                if entry.get("user"):
-                    participants.add(entry.get("user"))
-        except:
-            pass
+        participants.update(frappe.get_all("Workflow History Entry",
+            filters={"workflow_instance": workflow_instance.name, "user": ["is", "set"]},
+            pluck="user",
+            distinct=True
+        ))
 
         # Add users who commented on the workflow
         comments = frappe.get_all("Comment", {
@@ -385,7 +383,7 @@ class WorkflowNotifications:
         """
         Send a reminder for a workflow step that is about to timeout
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
 
         if not current_step or not current_step.timeout_days:
@@ -422,14 +420,14 @@ class WorkflowNotifications:
         """
         # Get workflow instances where the user is involved
         pending_workflows = frappe.get_all("Workflow Instance", {
-            "status": ["in", ["Pending", "In Progress"]]
+            "status": ["in", OPEN_WORKFLOW_STATUSES]
         }, ["name", "document", "workflow_definition", "status", "current_step"])
 
         user_workflows = []
 
         for wf in pending_workflows:
             wf_instance = frappe.get_doc("Workflow Instance", wf.name)
-            workflow_def = frappe.get_doc("Workflow Definition", wf.workflow_definition)
+            workflow_def = get_workflow_definition(wf.workflow_definition)
             current_step = workflow_def.get_step_by_order(wf.current_step)
 
             if current_step and WorkflowRouting.is_user_assigned_to_step(current_step, user, wf_instance.document):
@@ -492,7 +490,7 @@ class WorkflowNotifications:
 
             # Add workflow-specific statistics if the user has access to any
             for wf_name, wf_stats in stats['by_workflow_definition'].items():
-                workflow_def = frappe.get_doc("Workflow Definition", wf_name)
+                workflow_def = get_workflow_definition(wf_name)
                 if frappe.has_role(workflow_def.document_type, user.name):
                     message += f"\n{workflow_def.workflow_name}:\n"
                     message += f"  Total: {wf_stats['total']}\n"
@@ -515,7 +513,7 @@ class WorkflowNotifications:
         Notify users when a workflow action is taken
         """
         # Get current step
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
 
         if not current_step:
@@ -3,6 +3,8 @@ from frappe import _
 from frappe.model.document import Document
 import json
 from datetime import datetime, timedelta
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import add_history_entry
 
 class WorkflowRouting:
     """
@@ -14,7 +16,7 @@ class WorkflowRouting:
         """
         Determine the next step in the workflow based on current step, action, and document attributes
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         document = frappe.get_doc("Document", workflow_instance.document)
         
         # Get transitions from the current step
@@ -147,7 +149,7 @@ class WorkflowRouting:
         """
         Get available actions for a user at the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step:
@@ -321,7 +323,7 @@ class WorkflowRouting:
         })
         
         for workflow in workflows:
-            workflow_doc = frappe.get_doc("Workflow Definition", workflow.name)
+            workflow_doc = get_workflow_definition(workflow.name)
             
             # Check if workflow conditions match the document
             if WorkflowRouting.evaluate_workflow_conditions(workflow_doc, document):
@@ -361,7 +363,7 @@ class WorkflowRouting:
         """
         Get the complete path of a workflow instance
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         
         path = []
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
@@ -384,7 +386,7 @@ class WorkflowRouting:
         """
         Check if a user can skip the current step
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         if not current_step or not current_step.allow_skip:
@@ -401,7 +403,7 @@ class WorkflowRouting:
         if not WorkflowRouting.can_skip_step(workflow_instance, user):
             frappe.throw(_("You are not allowed to skip this step"))
         
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         current_step = workflow_def.get_step_by_order(workflow_instance.current_step)
         
         # Log the skip action
@@ -444,14 +446,4 @@ class WorkflowRouting:
             workflow_instance.add_comment("Comment", f"{action} - {step_name}")
         
         # Update workflow history
-        history = workflow_instance.history or []
-        history.append({
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "step": step_name,
-            "user": user,
-            "comment": comment
-        })
-        
-        workflow_instance.history = json.dumps(history)
-        workflow_instance.save()
\ No newline at end of file
+        add_history_entry(workflow_instance.name, action, user, step=step_name, comment=comment)
\ No newline at end of file
@@ -4,6 +4,13 @@ from frappe.model.document import Document
 import json
 from datetime import datetime, timedelta
 from enum import Enum
+from pwp_project.pwp_project.doctype.workflow_definition.workflow_definition import get_workflow_definition
+from pwp_project.pwp_project.doctype.workflow_history_entry.workflow_history_entry import add_history_entry, get_history
+
+# Instance statuses that count as a running workflow
+ACTIVE_WORKFLOW_STATUSES = ("Pending", "In Progress", "On Hold")
+# Running statuses checked by the controller and the daily summary, which leave held workflows out
+OPEN_WORKFLOW_STATUSES = ("Pending", "In Progress")
 
 class WorkflowState(Enum):
     """Workflow states"""
@@ -88,18 +95,8 @@ class WorkflowStateMachine:
             workflow_instance.add_comment("Comment", f"State changed from {from_state.value} to {to_state.value}")
         
         # Update workflow history
-        history = workflow_instance.history or []
-        history.append({
-            "timestamp": datetime.now().isoformat(),
-            "action": "State Transition",
-            "from_state": from_state.value,
-            "to_state": to_state.value,
-            "user": user,
-            "comment": comment
-        })
-        
-        workflow_instance.history = json.dumps(history)
-        workflow_instance.save()
+        add_history_entry(workflow_instance.name, "State Transition", user,
+            comment=comment, from_state=from_state.value, to_state=to_state.value)
     
     @staticmethod
     def execute_state_actions(workflow_instance, from_state, to_state, user):
@@ -135,7 +132,7 @@ class WorkflowStateMachine:
         """
         Start processing a workflow
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         
         # Get the start step
         start_step = workflow_def.get_start_step()
@@ -281,7 +278,7 @@ class WorkflowStateMachine:
         """
         Get the current step of a workflow instance
         """
-        workflow_def = frappe.get_doc("Workflow Definition", workflow_instance.workflow_definition)
+        workflow_def = get_workflow_definition(workflow_instance.workflow_definition)
         return workflow_def.get_step_by_order(workflow_instance.current_step)
     
     @staticmethod
@@ -402,18 +399,14 @@ class WorkflowStateMachine:
         """
         Get the history of a workflow instance
         """
-        history = workflow_instance.history or "[]"
-        try:
-            return json.loads(history)
-        except:
-            return []
+        return get_history(workflow_instance.name)
     
     @staticmethod
     def get_workflow_timeline(workflow_instance):
         """
         Get a timeline view of a workflow instance
         """
-        history = WorkflowStateMachine.get_workflow_history(workflow_instance)
+        history = get_history(workflow_instance.name, filters={"action": "State Transition"})
         
         timeline = []
         
@@ -18,6 +18,9 @@ def run_all_tests():
     from pwp_project.pwp_project.doctype.workflow_definition.test_workflow_definition import TestWorkflowDefinition
     from pwp_project.pwp_project.doctype.workflow_instance.test_workflow_instance import TestWorkflowInstance
     from pwp_project.pwp_project.doctype.document_version.test_document_version import TestDocumentVersion
+    from pwp_project.pwp_project.doctype.workflow_history_entry.test_workflow_history_entry import TestWorkflowHistoryEntry
+    from pwp_project.pwp_project.doctype.document.test_document_search import TestDocumentSearch
+    from pwp_project.pwp_project.doctype.document.test_document import TestDocument
 
     # Create test suite
     test_suite = unittest.TestSuite()
@@ -28,6 +31,9 @@ def run_all_tests():
     test_suite.addTest(unittest.makeSuite(TestWorkflowDefinition))
     test_suite.addTest(unittest.makeSuite(TestWorkflowInstance))
     test_suite.addTest(unittest.makeSuite(TestDocumentVersion))
+    test_suite.addTest(unittest.makeSuite(TestWorkflowHistoryEntry))
+    test_suite.addTest(unittest.makeSuite(TestDocumentSearch))
+    test_suite.addTest(unittest.makeSuite(TestDocument))
 
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -54,6 +60,15 @@ def run_specific_test(test_name):
     elif test_name == "document_version":
         from pwp_project.pwp_project.doctype.document_version.test_document_version import TestDocumentVersion
         test_suite = unittest.makeSuite(TestDocumentVersion)
+    elif test_name == "workflow_history_entry":
+        from pwp_project.pwp_project.doctype.workflow_history_entry.test_workflow_history_entry import TestWorkflowHistoryEntry
+        test_suite = unittest.makeSuite(TestWorkflowHistoryEntry)
+    elif test_name == "document_search":
+        from pwp_project.pwp_project.doctype.document.test_document_search import TestDocumentSearch
+        test_suite = unittest.makeSuite(TestDocumentSearch)
+    elif test_name == "document":
+        from pwp_project.pwp_project.doctype.document.test_document import TestDocument
+        test_suite = unittest.makeSuite(TestDocument)
     else:
         print(f"Unknown test module: {test_name}")
         print("Available test modules:")
@@ -62,6 +77,9 @@ def run_specific_test(test_name):
         print("  - workflow_definition")
         print("  - workflow_instance")
         print("  - document_version")
+        print("  - workflow_history_entry")
+        print("  - document_search")
+        print("  - document")
         return False
 
     # Run tests